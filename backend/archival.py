@@ -0,0 +1,163 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from database import db
+from models import Disposal, DisposalArchive, DisposalSummary
+
+logger = logging.getLogger(__name__)
+
+# Archival configuration
+ARCHIVE_CONFIG = {
+    'older_than_days': 180,  # disposals older than this are moved out of the hot table
+    'batch_size': 5000,      # rows moved per transaction
+}
+
+def archive_disposals(older_than_days=None, batch_size=None):
+    """Move old disposals into the archive table in batches, folding them into daily summaries
+
+    Each batch copies rows to disposals_archive, adds them to disposal_summaries
+    and deletes them from disposals in one transaction, so every disposal is
+    counted exactly once in either the hot table or the summaries.
+    """
+    older_than_days = older_than_days if older_than_days is not None else ARCHIVE_CONFIG['older_than_days']
+    batch_size = batch_size or ARCHIVE_CONFIG['batch_size']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    moved = 0
+    while True:
+        rows = Disposal.query.filter(Disposal.timestamp < cutoff).order_by(Disposal.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        try:
+            totals = {}
+            archive_rows = []
+            for d in rows:
+                archive_rows.append({
+                    'id': d.id,
+                    'user_id': d.user_id,
+                    'bin_id': d.bin_id,
+                    'waste_type': d.waste_type,
+                    'weight': d.weight,
+                    'points_earned': d.points_earned,
+                    'timestamp': d.timestamp
+                })
+                key = (d.timestamp.date(), d.user_id, d.waste_type)
+                count, weight, points = totals.get(key, (0, 0.0, 0))
+                totals[key] = (count + 1, weight + d.weight, points + d.points_earned)
+
+            db.session.bulk_insert_mappings(DisposalArchive, archive_rows)
+
+            days = {key[0] for key in totals}
+            existing = {
+                (s.day, s.user_id, s.waste_type): s
+                for s in DisposalSummary.query.filter(DisposalSummary.day.in_(days)).all()
+            }
+            for key, (count, weight, points) in totals.items():
+                summary = existing.get(key)
+                if summary is None:
+                    summary = DisposalSummary(day=key[0], user_id=key[1], waste_type=key[2],
+                                              disposal_count=0, weight=0.0, points_earned=0)
+                    db.session.add(summary)
+                summary.disposal_count += count
+                summary.weight += weight
+                summary.points_earned += points
+
+            Disposal.query.filter(Disposal.id.in_([d.id for d in rows])).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error archiving disposals: {str(e)}")
+            raise
+
+        moved += len(rows)
+        logger.info(f"Archived {moved} disposals older than {cutoff.isoformat()}")
+
+    return moved
+
+def archived_until():
+    """Timestamp of the newest archived disposal, or None if nothing is archived"""
+    return db.session.query(func.max(DisposalArchive.timestamp)).scalar()
+
+def disposal_totals(start=None, end=None, user_id=None):
+    """Count, weight and points per waste type across hot and archived disposals
+
+    `start` and `end` must fall on day boundaries when archived data is in range,
+    since archived disposals are only kept as daily totals.
+    """
+    hot = db.session.query(
+        Disposal.waste_type,
+        func.count(Disposal.id),
+        func.sum(Disposal.weight),
+        func.sum(Disposal.points_earned)
+    ).group_by(Disposal.waste_type)
+    archived = db.session.query(
+        DisposalSummary.waste_type,
+        func.sum(DisposalSummary.disposal_count),
+        func.sum(DisposalSummary.weight),
+        func.sum(DisposalSummary.points_earned)
+    ).group_by(DisposalSummary.waste_type)
+    if start:
+        hot = hot.filter(Disposal.timestamp >= start)
+        archived = archived.filter(DisposalSummary.day >= start.date())
+    if end:
+        hot = hot.filter(Disposal.timestamp < end)
+        archived = archived.filter(DisposalSummary.day < end.date())
+    if user_id:
+        hot = hot.filter(Disposal.user_id == user_id)
+        archived = archived.filter(DisposalSummary.user_id == user_id)
+
+    totals = {waste_type: {'count': 0, 'weight': 0.0, 'points': 0} for waste_type in ['dry', 'wet']}
+    for query in [hot, archived]:
+        for waste_type, count, weight, points in query.all():
+            entry = totals.setdefault(waste_type, {'count': 0, 'weight': 0.0, 'points': 0})
+            entry['count'] += int(count or 0)
+            entry['weight'] += float(weight or 0.0)
+            entry['points'] += int(points or 0)
+    return totals
+
+def user_totals(start=None, end=None):
+    """Disposal count and weight per user across hot and archived disposals"""
+    hot = db.session.query(
+        Disposal.user_id,
+        func.count(Disposal.id),
+        func.sum(Disposal.weight)
+    ).group_by(Disposal.user_id)
+    archived = db.session.query(
+        DisposalSummary.user_id,
+        func.sum(DisposalSummary.disposal_count),
+        func.sum(DisposalSummary.weight)
+    ).group_by(DisposalSummary.user_id)
+    if start:
+        hot = hot.filter(Disposal.timestamp >= start)
+        archived = archived.filter(DisposalSummary.day >= start.date())
+    if end:
+        hot = hot.filter(Disposal.timestamp < end)
+        archived = archived.filter(DisposalSummary.day < end.date())
+
+    totals = {}
+    for query in [hot, archived]:
+        for user_id, count, weight in query.all():
+            entry = totals.setdefault(user_id, {'count': 0, 'weight': 0.0})
+            entry['count'] += int(count or 0)
+            entry['weight'] += float(weight or 0.0)
+    return totals
+
+def archived_disposals(user_id=None, waste_type=None, start=None, end=None):
+    """Archived disposal rows matching the admin disposal filters, or [] when the range is all hot"""
+    until = archived_until()
+    if until is None or (start and start > until):
+        return []
+
+    query = DisposalArchive.query
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    if waste_type:
+        query = query.filter_by(waste_type=waste_type)
+    if start:
+        query = query.filter(DisposalArchive.timestamp >= start)
+    if end:
+        query = query.filter(DisposalArchive.timestamp <= end)
+    return query.order_by(DisposalArchive.timestamp.desc()).all()
@@ -0,0 +1,290 @@
+import re
+import logging
+from datetime import date
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import User, Disposal, DisposalSummary, Area, AreaDailyTotal
+
+logger = logging.getLogger(__name__)
+
+# Area aggregation configuration
+AREA_CONFIG = {
+    'backfill_batch_size': 1000,  # users assigned an area per transaction
+}
+
+# Street suffix abbreviations expanded before comparing localities
+ABBREVIATIONS = {
+    'rd': 'Road', 'st': 'Street', 'ln': 'Lane', 'ngr': 'Nagar', 'mkt': 'Market',
+    'extn': 'Extension', 'ext': 'Extension', 'sec': 'Sector', 'opp': 'Opposite', 'nr': 'Near',
+}
+
+# Alternative city spellings mapped to one name
+CITY_ALIASES = {
+    'bengaluru': 'Bangalore', 'bombay': 'Mumbai', 'madras': 'Chennai', 'poona': 'Pune',
+    'calcutta': 'Kolkata', 'new delhi': 'Delhi', 'gurugram': 'Gurgaon',
+}
+
+# Address parts that never identify a locality
+IGNORED_PARTS = {
+    'india', 'andhra pradesh', 'assam', 'bihar', 'goa', 'gujarat', 'haryana', 'karnataka', 'kerala',
+    'madhya pradesh', 'maharashtra', 'odisha', 'punjab', 'rajasthan', 'tamil nadu', 'telangana',
+    'uttar pradesh', 'uttarakhand', 'west bengal', 'delhi ncr', 'ncr',
+}
+
+PINCODE = re.compile(r'\b\d{3}\s?\d{3}\b')
+# Leading house, flat or plot numbers such as "12", "B-204", "Flat 4B", "No. 7/1"
+HOUSE_NUMBER = re.compile(r'^(?:(?:flat|house|plot|shop|door|no\.?|#)\s*)?[\w/-]*\d[\w/-]*[\s,.-]*', re.IGNORECASE)
+
+def _normalize(part):
+    words = []
+    for word in re.findall(r"[A-Za-z][A-Za-z.'&]*", part):
+        word = word.strip('.')
+        expanded = ABBREVIATIONS.get(word.lower())
+        if expanded:
+            words.append(expanded)
+        elif word.isupper() and len(word) <= 3:
+            words.append(word)  # initialisms like FC or JP
+        else:
+            words.append(word.capitalize())
+    return ' '.join(words)
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+def parse_area(address):
+    """Extract the locality and city from a free-text address, or None if nothing usable remains
+
+    Addresses are read as comma-separated parts ending in the city; pincodes,
+    states and the country are dropped, and the locality is the last part before
+    the city once any house number is removed.
+    """
+    if not address:
+        return None
+    parts = []
+    for part in re.split(r'[,;\n]+', address):
+        part = PINCODE.sub('', part).strip(' .-')
+        if part and part.lower() not in IGNORED_PARTS:
+            parts.append(part)
+    if not parts:
+        return None
+
+    city = None
+    if len(parts) > 1:
+        city = _normalize(parts.pop())
+        city = CITY_ALIASES.get(city.lower(), city) or None
+
+    locality = None
+    for part in reversed(parts):
+        locality = _normalize(HOUSE_NUMBER.sub('', part))
+        if locality:
+            break
+    if not locality:
+        if not city:
+            return None
+        locality, city = city, None
+
+    name = f'{locality}, {city}' if city else locality
+    return {'slug': _slug(name)[:120], 'name': name[:120], 'locality': locality[:100],
+            'city': city[:100] if city else None}
+
+def resolve_areas(parsed):
+    """Map parsed areas to Area ids by slug, creating the areas that do not exist yet"""
+    by_slug = {p['slug']: p for p in parsed if p}
+    if not by_slug:
+        return {}
+    ids = {slug: area_id for slug, area_id in
+           db.session.query(Area.slug, Area.id).filter(Area.slug.in_(list(by_slug)))}
+    for slug, fields in by_slug.items():
+        if slug in ids:
+            continue
+        try:
+            with db.session.begin_nested():
+                area = Area(**fields)
+                db.session.add(area)
+            ids[slug] = area.id
+        except IntegrityError:
+            # Created by a concurrent registration or backfill
+            ids[slug] = db.session.query(Area.id).filter_by(slug=slug).scalar()
+    return ids
+
+def assign_area(user):
+    """Set user.area_id from the user's address; returns the area id or None"""
+    parsed = parse_area(user.address)
+    user.area_id = resolve_areas([parsed])[parsed['slug']] if parsed else None
+    return user.area_id
+
+def record_disposal(user_id, timestamp, waste_type, weight, points):
+    """Add one disposal to its area's daily totals within the current transaction"""
+    area_id = db.session.query(User.area_id).filter_by(id=user_id).scalar()
+    if area_id is None:
+        return
+    add_totals({(timestamp.date(), area_id, waste_type): (1, weight, points)})
+
+def add_totals(totals):
+    """Add {(day, area_id, waste_type): (count, weight, points)} to area_daily_totals
+
+    Increments are applied in SQL, so concurrent writers never overwrite each other.
+    """
+    statement = (
+        update(AreaDailyTotal)
+        .where(AreaDailyTotal.day == bindparam('b_day'),
+               AreaDailyTotal.area_id == bindparam('b_area_id'),
+               AreaDailyTotal.waste_type == bindparam('b_waste_type'))
+        .values(disposal_count=AreaDailyTotal.disposal_count + bindparam('b_count'),
+                weight=AreaDailyTotal.weight + bindparam('b_weight'),
+                points_earned=AreaDailyTotal.points_earned + bindparam('b_points'))
+        .execution_options(synchronize_session=False)
+    )
+    for (day, area_id, waste_type), (count, weight, points) in totals.items():
+        params = {'b_day': day, 'b_area_id': area_id, 'b_waste_type': waste_type,
+                  'b_count': count, 'b_weight': weight, 'b_points': points}
+        if db.session.execute(statement, params).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(AreaDailyTotal).values(
+                    day=day, area_id=area_id, waste_type=waste_type,
+                    disposal_count=count, weight=weight, points_earned=points))
+        except IntegrityError:
+            # Inserted by a concurrent writer since the update above
+            db.session.execute(statement, params)
+
+def _user_disposal_totals(user_ids, area_of):
+    """Daily totals of the given users' hot and archived disposals, keyed by their areas"""
+    day = func.date(Disposal.timestamp)
+    hot = db.session.query(
+        Disposal.user_id, day, Disposal.waste_type,
+        func.count(Disposal.id), func.sum(Disposal.weight), func.sum(Disposal.points_earned)
+    ).filter(Disposal.user_id.in_(user_ids)).group_by(Disposal.user_id, day, Disposal.waste_type)
+    archived = db.session.query(
+        DisposalSummary.user_id, DisposalSummary.day, DisposalSummary.waste_type,
+        DisposalSummary.disposal_count, DisposalSummary.weight, DisposalSummary.points_earned
+    ).filter(DisposalSummary.user_id.in_(user_ids))
+
+    totals = {}
+    for query in [hot, archived]:
+        for user_id, day_value, waste_type, count, weight, points in query.all():
+            if isinstance(day_value, str):
+                day_value = date.fromisoformat(day_value)  # SQLite returns DATE() as text
+            key = (day_value, area_of[user_id], waste_type)
+            c, w, p = totals.get(key, (0, 0.0, 0))
+            totals[key] = (c + int(count or 0), w + float(weight or 0.0), p + int(points or 0))
+    return totals
+
+def backfill_areas(batch_size=None):
+    """Assign areas to users without one and add their past disposals to the area totals
+
+    Users are processed in keyset-paginated batches, one transaction each, so a
+    user's area and the totals of their disposals always change together.
+    Returns (assigned, unparsed).
+    """
+    batch_size = batch_size or AREA_CONFIG['backfill_batch_size']
+    statement = (
+        update(User)
+        .where(User.id == bindparam('b_id'), User.area_id.is_(None))
+        .values(area_id=bindparam('b_area_id'))
+        .execution_options(synchronize_session=False)
+    )
+    assigned = unparsed = 0
+    last_id = 0
+    while True:
+        users = db.session.query(User.id, User.address).filter(
+            User.id > last_id, User.area_id.is_(None)
+        ).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        last_id = users[-1].id
+
+        try:
+            parsed = {user_id: parse_area(address) for user_id, address in users}
+            ids = resolve_areas(parsed.values())
+            area_of = {user_id: ids[p['slug']] for user_id, p in parsed.items() if p}
+            if area_of:
+                db.session.connection().execute(statement, [{'b_id': u, 'b_area_id': a} for u, a in area_of.items()])
+                add_totals(_user_disposal_totals(list(area_of), area_of))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error backfilling areas: {str(e)}")
+            raise
+
+        assigned += len(area_of)
+        unparsed += len(users) - len(area_of)
+        logger.info(f"Assigned areas to {assigned} users ({unparsed} addresses unparsed)")
+
+    return assigned, unparsed
+
+def rebuild_area_totals(batch_size=None):
+    """Recompute area_daily_totals from scratch in one transaction"""
+    batch_size = batch_size or AREA_CONFIG['backfill_batch_size']
+    try:
+        AreaDailyTotal.query.delete(synchronize_session=False)
+        last_id = 0
+        while True:
+            users = db.session.query(User.id, User.area_id).filter(
+                User.id > last_id, User.area_id.isnot(None)
+            ).order_by(User.id).limit(batch_size).all()
+            if not users:
+                break
+            last_id = users[-1].id
+            area_of = dict(users)
+            add_totals(_user_disposal_totals(list(area_of), area_of))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error rebuilding area totals: {str(e)}")
+        raise
+
+def find_area(ref):
+    """Look up an area by id or slug"""
+    if ref is None:
+        return None
+    if str(ref).isdigit():
+        return db.session.get(Area, int(ref))
+    return Area.query.filter_by(slug=_slug(str(ref))).first()
+
+def _filtered(query, area_id, start, end, waste_type):
+    query = query.filter(AreaDailyTotal.area_id == area_id)
+    if start:
+        query = query.filter(AreaDailyTotal.day >= start.date())
+    if end:
+        query = query.filter(AreaDailyTotal.day < end.date())
+    if waste_type:
+        query = query.filter(AreaDailyTotal.waste_type == waste_type)
+    return query
+
+def area_totals(area_id, start=None, end=None, waste_type=None):
+    """Count, weight and points per waste type for an area, read from the daily totals
+
+    Like `archival.disposal_totals`, `start` and `end` are used at day granularity.
+    """
+    query = _filtered(db.session.query(
+        AreaDailyTotal.waste_type,
+        func.sum(AreaDailyTotal.disposal_count),
+        func.sum(AreaDailyTotal.weight),
+        func.sum(AreaDailyTotal.points_earned)
+    ).group_by(AreaDailyTotal.waste_type), area_id, start, end, waste_type)
+
+    totals = {waste_type: {'count': 0, 'weight': 0.0, 'points': 0} for waste_type in ['dry', 'wet']}
+    for row_type, count, weight, points in query.all():
+        totals[row_type] = {'count': int(count or 0), 'weight': float(weight or 0.0), 'points': int(points or 0)}
+    return totals
+
+def area_daily(area_id, start=None, end=None, waste_type=None):
+    """Per-day totals for an area, oldest first"""
+    rows = _filtered(AreaDailyTotal.query, area_id, start, end, waste_type).order_by(AreaDailyTotal.day).all()
+    days = {}
+    for row in rows:
+        entry = days.setdefault(row.day, {'date': row.day.isoformat(), 'disposals': 0, 'total_waste_kg': 0.0,
+                                          'dry_waste_kg': 0.0, 'wet_waste_kg': 0.0, 'points_earned': 0})
+        entry['disposals'] += row.disposal_count
+        entry['total_waste_kg'] += row.weight
+        entry[f'{row.waste_type}_waste_kg'] += row.weight
+        entry['points_earned'] += row.points_earned
+    for entry in days.values():
+        for key in ['total_waste_kg', 'dry_waste_kg', 'wet_waste_kg']:
+            entry[key] = round(entry[key], 2)
+    return list(days.values())
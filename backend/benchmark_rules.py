@@ -0,0 +1,76 @@
+"""Script to benchmark reward rule evaluation throughput"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from models import RewardRule
+from rules import CompiledRules
+
+def sample_rules():
+    """A representative campaign mix: base rates, peak hours, bin bonuses, caps and streaks"""
+    now = datetime.utcnow()
+    specs = [
+        ('base_rate', 'dry', {'points_per_kg': 15}, None, None),
+        ('base_rate', 'wet', {'points_per_kg': 10}, None, None),
+        ('base_rate', 'dry', {'points_per_kg': 30}, now - timedelta(days=3), now + timedelta(days=4)),
+        ('time_multiplier', None, {'start_hour': 6, 'end_hour': 9, 'multiplier': 1.5}, None, None),
+        ('time_multiplier', 'wet', {'start_hour': 22, 'end_hour': 2, 'multiplier': 0.5}, None, None),
+        ('weight_cap', 'dry', {'max_kg': 10}, None, None),
+        ('weight_cap', 'wet', {'max_kg': 20}, None, None),
+        ('streak_bonus', None, {'min_days': 3, 'bonus_points': 5}, None, None),
+        ('streak_bonus', None, {'min_days': 7, 'bonus_points': 20}, None, None),
+    ]
+    specs += [('bin_bonus', None, {'bin_id': b, 'multiplier': 1.2, 'bonus_points': 2}, None, None)
+              for b in range(1, 200, 3)]
+    return [
+        RewardRule(id=i + 1, name=f'rule {i + 1}', kind=kind, waste_type=waste_type,
+                   params=json.dumps(params), starts_at=starts_at, ends_at=ends_at, active=True)
+        for i, (kind, waste_type, params, starts_at, ends_at) in enumerate(specs)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure scalar and batch reward rule evaluation throughput')
+    parser.add_argument('--events', type=int, default=1_000_000, help='events evaluated by the batch API')
+    parser.add_argument('--scalar-events', type=int, default=100_000, help='events evaluated by the scalar API')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    compiled = CompiledRules(sample_rules())
+    print(f"Compiled {len(sample_rules())} rules in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    rng = np.random.default_rng(42)
+    now = datetime.utcnow()
+    waste_types = rng.choice(np.array(['dry', 'wet']), args.events)
+    weights = rng.uniform(0.1, 25.0, args.events)
+    offsets = rng.integers(0, 14 * 86400, args.events)
+    timestamps = (now - timedelta(days=7) - datetime(1970, 1, 1)).total_seconds() + offsets
+    bin_ids = rng.integers(1, 250, args.events)
+    streaks = rng.integers(0, 10, args.events)
+
+    start = time.perf_counter()
+    batch = compiled.points_batch(waste_types, weights, timestamps, bin_ids, streaks)
+    elapsed = time.perf_counter() - start
+    print(f"Batch:  {args.events:>10,} events in {elapsed:.3f}s ({args.events / elapsed:,.0f} events/s)")
+
+    n = min(args.scalar_events, args.events)
+    whens = [datetime(1970, 1, 1) + timedelta(seconds=float(t)) for t in timestamps[:n]]
+    rows = list(zip(waste_types[:n].tolist(), weights[:n].tolist(), whens,
+                    bin_ids[:n].tolist(), streaks[:n].tolist()))
+    start = time.perf_counter()
+    scalar = [compiled.points(w, kg, when, b, s) for w, kg, when, b, s in rows]
+    elapsed = time.perf_counter() - start
+    print(f"Scalar: {n:>10,} events in {elapsed:.3f}s ({n / elapsed:,.0f} events/s)")
+
+    mismatches = int(np.count_nonzero(np.array(scalar) != batch[:n]))
+    print(f"Scalar and batch results differ for {mismatches} of {n} events")
+
+if __name__ == '__main__':
+    main()
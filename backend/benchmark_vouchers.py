@@ -0,0 +1,96 @@
+"""Script to benchmark concurrent voucher redemptions"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import Flask
+from sqlalchemy import func
+from database import db
+from models import User, Reward, VoucherCode
+from vouchers import import_codes, generate_codes, redeem, REDEEMED
+
+app = Flask(__name__)
+# Writes test users, rewards and codes, so it defaults to a throwaway SQLite database
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark_vouchers.db')}")
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}} \
+    if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else {}
+db.init_app(app)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure voucher redemptions per second under concurrency')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--codes', type=int, default=5000, help='codes in the pool')
+    parser.add_argument('--redemptions', type=int, default=4000, help='redemptions attempted in total')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        reward = Reward(name='Benchmark voucher', description='Benchmark voucher', points_required=1, active=True)
+        db.session.add(reward)
+        db.session.flush()
+        run = uuid.uuid4().hex[:8]
+        users = [User(name=f'Bench {i}', phone=f'b{run}{i:04d}',
+                      address='Benchmark', qr_code=f'BENCH-{run}-{i}',
+                      reward_points=args.redemptions)
+                 for i in range(args.threads)]
+        db.session.add_all(users)
+        import_codes(reward, generate_codes(args.codes, 'BENCH'))
+        db.session.commit()
+        reward_id = reward.id
+        user_ids = [u.id for u in users]
+
+    claimed = []
+    failures = [0]
+    lock = threading.Lock()
+    per_thread = args.redemptions // args.threads
+
+    def worker(user_id):
+        with app.app_context():
+            reward = db.session.get(Reward, reward_id)
+            codes = []
+            for _ in range(per_thread):
+                # The same transaction /api/rewards/redeem runs
+                try:
+                    outcome, _, code = redeem(user_id, reward)
+                except Exception:
+                    db.session.rollback()
+                    outcome = None
+                if outcome != REDEEMED:
+                    with lock:
+                        failures[0] += 1
+                else:
+                    codes.append(code)
+            db.session.remove()
+            with lock:
+                claimed.extend(codes)
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        available = db.session.query(func.count(VoucherCode.id)).filter_by(reward_id=reward_id, status='available').scalar()
+        dialect = db.engine.dialect.name
+
+    print(f"Database: {dialect}")
+    print(f"Threads: {args.threads}, pool: {args.codes} codes")
+    print(f"Redemptions: {len(claimed)} in {elapsed:.2f} s ({len(claimed) / elapsed:,.0f} redemptions/s)")
+    print(f"Failed or out of stock: {failures[0]}")
+    print(f"Duplicate codes issued: {len(claimed) - len(set(claimed))}")
+    print(f"Codes left in pool: {available}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+import os
+import time
+import uuid
+import errno
+import fcntl
+import pickle
+import socket
+import hashlib
+import random
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+CACHE_CONFIG = {
+    'backend': os.environ.get('CACHE_BACKEND', 'memory'),  # memory, file or redis
+    'url': os.environ.get('CACHE_URL', 'redis://localhost:6379/0'),
+    'directory': os.environ.get('CACHE_DIR', '/tmp/waste_disposal_cache'),
+    'max_entries': 10000,  # memory backend LRU size
+    'default_ttl': 60,     # seconds
+    'lock_ttl': 10,        # seconds a recomputation lock is held before others give up waiting
+    'version_ttl': 1,      # seconds a worker trusts its copy of a namespace version
+}
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry; not shared between workers"""
+
+    shared = False
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or CACHE_CONFIG['max_entries']
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _live(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        with self.lock:
+            entry = self._live(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        with self.lock:
+            if self._live(key, time.time()):
+                return False
+        self.set(key, value, ttl)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def counter(self, key):
+        return self.get(key) or 0
+
+    def incr(self, key):
+        with self.lock:
+            entry = self._live(key, time.time())
+            value = (entry[0] if entry else 0) + 1
+            self.entries[key] = (value, None)
+            return value
+
+class FileBackend:
+    """Cache shared by all workers on one host through files in a local directory"""
+
+    shared = True
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory or CACHE_CONFIG['directory'])
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.directory / hashlib.sha1(key.encode()).hexdigest()
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                value, expires = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires <= time.time():
+            return None
+        return (value,)
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        path = self._path(key)
+        tmp = path.with_suffix(f'.{uuid.uuid4().hex}.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump((value, time.time() + ttl if ttl else None), f)
+        os.replace(tmp, path)
+        if random.random() < 0.01:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, including those orphaned by version bumps"""
+        for path in self.directory.iterdir():
+            if not path.name.startswith('.') and path.suffix != '.tmp' and self._read(path) is None:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def add(self, key, value, ttl=None):
+        path = self._path(key)
+        if path.exists() and self._read(path) is None:
+            # Expired entry; remove it so the exclusive create below can succeed
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                return False
+            raise
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((value, time.time() + ttl if ttl else None), f)
+        return True
+
+    def delete(self, key):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def counter(self, key):
+        return self.get(key) or 0
+
+    def incr(self, key):
+        with open(self.directory / '.incr.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                value = (self.get(key) or 0) + 1
+                self.set(key, value)
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+class RedisBackend:
+    """Minimal client for any server speaking the Redis protocol (RESP)"""
+
+    shared = True
+
+    def __init__(self, url=None, timeout=2.0):
+        parsed = urlparse(url or CACHE_CONFIG['url'])
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = self.local.conn = (sock, sock.makefile('rb'))
+            if self.password:
+                self._call(conn, 'AUTH', self.password)
+            if self.db:
+                self._call(conn, 'SELECT', self.db)
+        return conn
+
+    def _call(self, conn, *args):
+        sock, reader = conn
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f'${len(data)}\r\n'.encode() + data + b'\r\n')
+        sock.sendall(b''.join(parts))
+        return self._reply(reader)
+
+    def _reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by cache server')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise RuntimeError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            size = int(body)
+            if size < 0:
+                return None
+            data = reader.read(size + 2)
+            return data[:-2]
+        if kind == b'*':
+            size = int(body)
+            return None if size < 0 else [self._reply(reader) for _ in range(size)]
+        raise RuntimeError(f'Unexpected reply from cache server: {line!r}')
+
+    def execute(self, *args):
+        try:
+            return self._call(self._connection(), *args)
+        except (OSError, ConnectionError):
+            # Reconnect once on a dropped connection
+            self.local.conn = None
+            return self._call(self._connection(), *args)
+
+    def get(self, key):
+        data = self.execute('GET', key)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, key, value, ttl=None):
+        args = ['SET', key, pickle.dumps(value)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        self.execute(*args)
+
+    def add(self, key, value, ttl=None):
+        args = ['SET', key, pickle.dumps(value), 'NX']
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        return self.execute(*args) is not None
+
+    def delete(self, key):
+        self.execute('DEL', key)
+
+    def counter(self, key):
+        # INCR stores plain integers, not pickles
+        return int(self.execute('GET', key) or 0)
+
+    def incr(self, key):
+        return self.execute('INCR', key)
+
+class Cache:
+    """Namespaced cache with versioned-key invalidation and stampede protection
+
+    Keys embed their namespace version, which lives in the backend itself, so
+    bumping a version with a shared backend invalidates the namespace for every
+    worker at once. Old entries are never read again and simply expire.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.shared = backend.shared  # whether a delete here is seen by every worker
+        self.versions = {}
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def version(self, namespace):
+        cached = self.versions.get(namespace)
+        now = time.time()
+        if cached and now - cached[1] < CACHE_CONFIG['version_ttl']:
+            return cached[0]
+        try:
+            version = self.backend.counter(f'version:{namespace}')
+        except Exception as e:
+            logger.warning(f"Cache unavailable reading version of {namespace}: {str(e)}")
+            version = cached[0] if cached else 0
+        self.versions[namespace] = (version, now)
+        return version
+
+    def key(self, namespace, key):
+        return f'{namespace}:v{self.version(namespace)}:{key}'
+
+    def get(self, namespace, key):
+        try:
+            return self.backend.get(self.key(namespace, key))
+        except Exception as e:
+            logger.warning(f"Cache get failed for {namespace}:{key}: {str(e)}")
+            return None
+
+    def set(self, namespace, key, value, ttl=None):
+        try:
+            self.backend.set(self.key(namespace, key), value, ttl or CACHE_CONFIG['default_ttl'])
+        except Exception as e:
+            logger.warning(f"Cache set failed for {namespace}:{key}: {str(e)}")
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self.key(namespace, key))
+        except Exception as e:
+            logger.warning(f"Cache delete failed for {namespace}:{key}: {str(e)}")
+
+    def invalidate(self, namespace):
+        """Bump the namespace version, orphaning every key in it for all workers"""
+        try:
+            version = self.backend.incr(f'version:{namespace}')
+            self.versions[namespace] = (version, time.time())
+        except Exception as e:
+            logger.warning(f"Cache invalidation failed for {namespace}: {str(e)}")
+
+    def get_or_compute(self, namespace, key, compute, ttl=None):
+        """Return the cached value, computing it once across workers on a miss
+
+        One thread per worker takes a local lock and one worker takes a
+        short-lived lock key in the backend; the others wait for its result
+        instead of all running `compute` at the same time. Local locks are
+        reference counted and only dropped once no thread is waiting on them.
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+
+        full_key = self.key(namespace, key)
+        with self.locks_lock:
+            entry = self.locks.get(full_key)
+            if entry is None:
+                entry = self.locks[full_key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                return self._compute_once(namespace, key, f'lock:{full_key}', compute, ttl)
+        finally:
+            with self.locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.locks[full_key]
+
+    def _compute_once(self, namespace, key, lock_key, compute, ttl):
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+
+        lock_ttl = CACHE_CONFIG['lock_ttl']
+        try:
+            acquired = self.backend.add(lock_key, 1, lock_ttl)
+        except Exception:
+            acquired = True
+        if not acquired:
+            deadline = time.time() + lock_ttl
+            while time.time() < deadline:
+                time.sleep(0.05)
+                value = self.get(namespace, key)
+                if value is not None:
+                    return value
+
+        try:
+            value = compute()
+            self.set(namespace, key, value, ttl)
+            return value
+        finally:
+            if acquired:
+                try:
+                    self.backend.delete(lock_key)
+                except Exception:
+                    pass
+
+def create_cache(backend=None):
+    backend = backend or CACHE_CONFIG['backend']
+    if backend == 'memory':
+        return Cache(MemoryBackend())
+    if backend == 'file':
+        return Cache(FileBackend())
+    if backend == 'redis':
+        return Cache(RedisBackend())
+    raise ValueError(f'Unknown cache backend: {backend}')
+
+cache = create_cache()
@@ -12,6 +12,7 @@ def init_db():
         
         # Import models here to avoid circular import
         from models import Admin, Reward
+        from rules import seed_default_rules
         from werkzeug.security import generate_password_hash
         
         # Create default admin if not exists
@@ -38,6 +39,9 @@ def init_db():
                 db.session.add(reward)
                 logger.info(f"Default reward created: {reward_data['name']}")
         
+        # Create default reward rules if none exist
+        seed_default_rules()
+        
         db.session.commit()
         logger.info("Database initialized successfully")
         
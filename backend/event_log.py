@@ -0,0 +1,331 @@
+import os
+import mmap
+import json
+import struct
+import fcntl
+import bisect
+import threading
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from database import db
+from models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Event log configuration
+EVENT_LOG_CONFIG = {
+    'directory': os.environ.get('EVENT_LOG_DIR', str(Path(__file__).parent / 'event_log')),
+    'segment_records': 1_000_000,  # records per segment file before rotating
+    'relay_batch_size': 500,       # outbox rows moved into the log per relay pass
+    'relay_interval': 1.0,         # seconds between relay passes when no commit wakes the relay
+}
+
+# Event kinds
+DISPOSAL_DRY = 1
+DISPOSAL_WET = 2
+REDEMPTION = 3
+
+EVENT_KINDS = {
+    'disposal:dry': DISPOSAL_DRY,
+    'disposal:wet': DISPOSAL_WET,
+    'redemption': REDEMPTION,
+}
+
+# outbox_id, kind, timestamp, ref_id, user_id, aux_id (bin/reward), weight, points (+earned/-used)
+RECORD = struct.Struct('<QBdIIIfi')
+RECORD_SIZE = RECORD.size
+
+Event = namedtuple('Event', 'offset outbox_id kind timestamp ref_id user_id aux_id weight points')
+
+def disposal_event(disposal):
+    """Build the outbox row for a disposal"""
+    return OutboxEvent(
+        kind=EVENT_KINDS[f'disposal:{disposal.waste_type}'],
+        payload=json.dumps({
+            'ref_id': disposal.id,
+            'user_id': disposal.user_id,
+            'aux_id': disposal.bin_id or 0,
+            'weight': disposal.weight,
+            'points': disposal.points_earned,
+            'timestamp': disposal.timestamp.replace(tzinfo=timezone.utc).timestamp()
+        })
+    )
+
+def redemption_event(redemption):
+    """Build the outbox row for a redemption"""
+    return OutboxEvent(
+        kind=REDEMPTION,
+        payload=json.dumps({
+            'ref_id': redemption.id,
+            'user_id': redemption.user_id,
+            'aux_id': redemption.reward_id,
+            'weight': 0.0,
+            'points': -redemption.points_used,
+            'timestamp': redemption.timestamp.replace(tzinfo=timezone.utc).timestamp()
+        })
+    )
+
+class EventLog:
+    """Append-only log of fixed-size event records split into rotated segment files"""
+
+    def __init__(self, directory=None, segment_records=None):
+        self.directory = Path(directory or EVENT_LOG_CONFIG['directory'])
+        self.segment_records = segment_records or EVENT_LOG_CONFIG['segment_records']
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.maps = {}
+
+    def segments(self):
+        """Base offsets of all segments, oldest first"""
+        return sorted(int(p.stem) for p in self.directory.glob('*.log'))
+
+    def segment_path(self, base):
+        return self.directory / f'{base:020d}.log'
+
+    def end_offset(self):
+        """Offset one past the last complete record"""
+        segments = self.segments()
+        if not segments:
+            return 0
+        base = segments[-1]
+        return base + self.segment_path(base).stat().st_size // RECORD_SIZE
+
+    @contextmanager
+    def writer(self):
+        """Hold the thread and cross-process locks that serialize writers"""
+        with self.lock:
+            with open(self.directory / '.lock', 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield self
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def append(self, records):
+        """Append packed records, rotating segments as they fill; returns the first offset"""
+        with self.writer():
+            return self.write(records)
+
+    def write(self, records):
+        """Append records; the caller must hold writer()"""
+        segments = self.segments()
+        base = segments[-1] if segments else 0
+        path = self.segment_path(base)
+        size = path.stat().st_size if path.exists() else 0
+        if size % RECORD_SIZE:
+            # Drop a torn trailing record left by a crash mid-write
+            size -= size % RECORD_SIZE
+            os.truncate(path, size)
+        first = offset = base + size // RECORD_SIZE
+
+        i = 0
+        while i < len(records):
+            if offset - base >= self.segment_records:
+                base = offset
+                path = self.segment_path(base)
+            room = self.segment_records - (offset - base)
+            chunk = records[i:i + room]
+            with open(path, 'ab') as f:
+                f.write(b''.join(chunk))
+                f.flush()
+                os.fsync(f.fileno())
+            offset += len(chunk)
+            i += len(chunk)
+        return first
+
+    def _map(self, base):
+        """Memory-map a segment, reusing the mapping while the file has not grown"""
+        path = self.segment_path(base)
+        size = path.stat().st_size
+        cached = self.maps.get(base)
+        if cached and len(cached) == size:
+            return cached
+        if size == 0:
+            return None
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps[base] = mapped
+        return mapped
+
+    def read(self, offset=0, limit=None):
+        """Yield events starting at `offset` through memory-mapped segments"""
+        segments = self.segments()
+        if not segments:
+            return
+        i = max(bisect.bisect_right(segments, offset) - 1, 0)
+        offset = max(offset, segments[0])
+        remaining = limit
+        for base in segments[i:]:
+            mapped = self._map(base)
+            if mapped is None:
+                continue
+            count = len(mapped) // RECORD_SIZE
+            for n in range(offset - base, count):
+                if remaining is not None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                yield Event(base + n, *RECORD.unpack_from(mapped, n * RECORD_SIZE))
+            offset = base + count
+
+    def close(self):
+        for mapped in self.maps.values():
+            mapped.close()
+        self.maps = {}
+
+class Consumer:
+    """Named reader that tracks its committed offset in the log directory"""
+
+    def __init__(self, log, name):
+        self.log = log
+        self.path = log.directory / 'consumers' / f'{name}.offset'
+        self.path.parent.mkdir(exist_ok=True)
+        self.offset = int(self.path.read_text()) if self.path.exists() else 0
+        self.pending = self.offset
+
+    def poll(self, max_events=1000):
+        events = list(self.log.read(self.offset, max_events))
+        if events:
+            self.pending = events[-1].offset + 1
+        return events
+
+    def commit(self):
+        self.offset = self.pending
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(str(self.offset))
+        os.replace(tmp, self.path)
+
+def relay_outbox(log=None, batch_size=None):
+    """Move committed outbox rows into the event log and delete them from the outbox
+
+    Delivery is at-least-once: if the delete fails to commit after the append,
+    the rows are appended again on the next pass, so consumers that need exact
+    counts should de-duplicate on outbox_id.
+    """
+    log = log or event_log
+    batch_size = batch_size or EVENT_LOG_CONFIG['relay_batch_size']
+    moved = 0
+    try:
+        with log.writer():
+            moved = _relay(log, batch_size)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error relaying outbox events: {str(e)}")
+    return moved
+
+def _relay(log, batch_size):
+    moved = 0
+    while True:
+        rows = OutboxEvent.query.order_by(OutboxEvent.id).limit(batch_size).all()
+        if not rows:
+            break
+        records = []
+        for row in rows:
+            payload = json.loads(row.payload)
+            records.append(RECORD.pack(
+                row.id, row.kind, payload['timestamp'], payload['ref_id'],
+                payload['user_id'], payload['aux_id'], payload['weight'], payload['points']
+            ))
+        OutboxEvent.query.filter(OutboxEvent.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+        log.write(records)
+        db.session.commit()
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+    return moved
+
+class OutboxRelay:
+    """Background thread that relays the outbox after commits, off the request path
+
+    Requests only call wake(), which never blocks; the thread also runs every
+    relay_interval seconds to pick up rows committed by other workers or left
+    behind by a crash.
+    """
+
+    def __init__(self, log=None):
+        self.log = log
+        self.app = None
+        self.on_relayed = None
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+    def init_app(self, app, on_relayed=None):
+        """Set the app whose context the relay runs in and a callback for after rows are relayed"""
+        self.app = app
+        self.on_relayed = on_relayed
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        """Relay now instead of waiting for the next interval; starts the thread on first use"""
+        if self.thread is None:
+            self.start()
+        self.wake_event.set()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait(EVENT_LOG_CONFIG['relay_interval'])
+            self.wake_event.clear()
+            with self.app.app_context():
+                try:
+                    moved = relay_outbox(self.log)
+                finally:
+                    db.session.remove()
+            if moved and self.on_relayed:
+                self.on_relayed()
+
+def rebuild_rollups(log=None, start=0, end=None):
+    """Rebuild overall counters and daily rollups by replaying offsets [start, end)"""
+    log = log or event_log
+    seen = set()
+    totals = {
+        'events': 0,
+        'duplicates': 0,
+        'total_disposals': 0,
+        'dry_waste_kg': 0.0,
+        'wet_waste_kg': 0.0,
+        'total_points_distributed': 0,
+        'total_redemptions': 0,
+        'total_points_redeemed': 0,
+    }
+    daily = {}
+    for event in log.read(start, None if end is None else max(end - start, 0)):
+        if event.outbox_id in seen:
+            totals['duplicates'] += 1
+            continue
+        seen.add(event.outbox_id)
+        totals['events'] += 1
+        day = datetime.utcfromtimestamp(event.timestamp).date().isoformat()
+        rollup = daily.setdefault(day, {'disposals': 0, 'waste_kg': 0.0, 'points_earned': 0,
+                                        'redemptions': 0, 'points_redeemed': 0})
+        if event.kind == REDEMPTION:
+            totals['total_redemptions'] += 1
+            totals['total_points_redeemed'] -= event.points
+            rollup['redemptions'] += 1
+            rollup['points_redeemed'] -= event.points
+        else:
+            key = 'dry_waste_kg' if event.kind == DISPOSAL_DRY else 'wet_waste_kg'
+            totals['total_disposals'] += 1
+            totals[key] += event.weight
+            totals['total_points_distributed'] += event.points
+            rollup['disposals'] += 1
+            rollup['waste_kg'] += event.weight
+            rollup['points_earned'] += event.points
+
+    totals['dry_waste_kg'] = round(totals['dry_waste_kg'], 2)
+    totals['wet_waste_kg'] = round(totals['wet_waste_kg'], 2)
+    for rollup in daily.values():
+        rollup['waste_kg'] = round(rollup['waste_kg'], 2)
+    return {'totals': totals, 'daily': daily}
+
+event_log = EventLog()
+outbox_relay = OutboxRelay()
@@ -0,0 +1,148 @@
+import json
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+
+from event_log import event_log, DISPOSAL_DRY, REDEMPTION
+
+logger = logging.getLogger(__name__)
+
+# Live feed configuration
+LIVE_FEED_CONFIG = {
+    'subscriber_buffer': 256,  # frames buffered per subscriber before the oldest are dropped
+    'poll_interval': 0.5,      # seconds between checks of the event log for new records
+    'heartbeat_seconds': 15,   # idle time before a keep-alive comment is sent
+}
+
+def format_event(event):
+    """Render an event log record as SSE frames: the event itself and its counter deltas"""
+    timestamp = datetime.utcfromtimestamp(event.timestamp).isoformat()
+    if event.kind == REDEMPTION:
+        name = 'redemption'
+        data = {
+            'id': event.ref_id,
+            'user_id': event.user_id,
+            'reward_id': event.aux_id,
+            'points_used': -event.points,
+            'timestamp': timestamp
+        }
+        deltas = {'total_redemptions': 1, 'total_points_redeemed': -event.points}
+    else:
+        name = 'disposal'
+        waste_type = 'dry' if event.kind == DISPOSAL_DRY else 'wet'
+        weight = round(event.weight, 3)
+        data = {
+            'id': event.ref_id,
+            'user_id': event.user_id,
+            'bin_id': event.aux_id or None,
+            'waste_type': waste_type,
+            'weight': weight,
+            'points_earned': event.points,
+            'timestamp': timestamp
+        }
+        deltas = {'total_disposals': 1, 'total_waste_kg': weight,
+                  f'{waste_type}_waste_kg': weight, 'total_points_distributed': event.points}
+    return (f'id: {event.offset}\nevent: {name}\ndata: {json.dumps(data)}\n\n'
+            f'id: {event.offset}\nevent: counters\ndata: {json.dumps(deltas)}\n\n')
+
+class Subscriber:
+    """Bounded frame buffer for one open stream; the oldest frames are dropped when it is full"""
+
+    def __init__(self, size):
+        self.frames = deque(maxlen=size)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def push(self, frame):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+            self.condition.notify()
+
+    def drain(self, timeout):
+        """Wait up to `timeout` seconds and return all buffered frames"""
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            frames = list(self.frames)
+            self.frames.clear()
+            return frames
+
+class LiveFeed:
+    """Fans out new event log records to open SSE streams
+
+    One thread per worker tails the shared event log, so every worker sees the
+    disposals and redemptions written by all workers, event ids are log offsets
+    that stay valid across workers and restarts, and no stream touches the DB.
+    """
+
+    def __init__(self, log=None):
+        self.log = log or event_log
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.offset = None
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.offset = self.log.end_offset()
+                self.thread = threading.Thread(target=self._run, name='live-feed', daemon=True)
+                self.thread.start()
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber, replaying buffered history after `last_event_id` if given"""
+        self.start()
+        subscriber = Subscriber(LIVE_FEED_CONFIG['subscriber_buffer'])
+        with self.lock:
+            if last_event_id is not None:
+                start = max(last_event_id + 1, self.offset - subscriber.frames.maxlen, 0)
+                for event in self.log.read(start, max(self.offset - start, 0)):
+                    subscriber.push(format_event(event))
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def wake(self):
+        """Check the log now instead of waiting for the next poll"""
+        self.wake_event.set()
+
+    def _run(self):
+        while True:
+            self.wake_event.wait(LIVE_FEED_CONFIG['poll_interval'])
+            self.wake_event.clear()
+            try:
+                end = self.log.end_offset()
+                if end <= self.offset:
+                    continue
+                frames = [format_event(e) for e in self.log.read(self.offset, end - self.offset)]
+                with self.lock:
+                    for subscriber in self.subscribers:
+                        for frame in frames:
+                            subscriber.push(frame)
+                    self.offset = end
+            except Exception as e:
+                logger.error(f"Error publishing live feed events: {str(e)}")
+
+    def stream(self, subscriber):
+        """Generator of SSE text for a subscriber, with keep-alive comments while idle"""
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                frames = subscriber.drain(LIVE_FEED_CONFIG['heartbeat_seconds'])
+                if not frames:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield ''.join(frames)
+        finally:
+            self.unsubscribe(subscriber)
+            if subscriber.dropped:
+                logger.info(f"Live feed subscriber closed after dropping {subscriber.dropped} frames")
+
+live_feed = LiveFeed()
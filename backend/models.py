@@ -10,6 +10,7 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(15), unique=True, nullable=False)
     address = db.Column(db.String(255), nullable=False)
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=True, index=True)  # locality parsed from address
     qr_code = db.Column(db.String(100), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     reward_points = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -26,14 +27,122 @@ class Disposal(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    bin_id = db.Column(db.Integer, db.ForeignKey('bins.id'), nullable=True)
     waste_type = db.Column(db.String(10), nullable=False)  # 'dry' or 'wet'
     weight = db.Column(db.Float, nullable=False)  # in kg
     points_earned = db.Column(db.Integer, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<Disposal {self.id} - {self.waste_type}>'
 
+class DisposalArchive(db.Model):
+    __tablename__ = 'disposals_archive'
+    
+    # Same ids as the hot disposals rows they were moved from
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    bin_id = db.Column(db.Integer, nullable=True)
+    waste_type = db.Column(db.String(10), nullable=False)
+    weight = db.Column(db.Float, nullable=False)
+    points_earned = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DisposalArchive {self.id} - {self.waste_type}>'
+
+class DisposalSummary(db.Model):
+    __tablename__ = 'disposal_summaries'
+    __table_args__ = (db.UniqueConstraint('day', 'user_id', 'waste_type'),)
+    
+    # Daily per-user totals of archived disposals
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    waste_type = db.Column(db.String(10), nullable=False)
+    disposal_count = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Float, nullable=False, default=0.0)
+    points_earned = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DisposalSummary {self.day} {self.user_id} {self.waste_type}>'
+
+class Area(db.Model):
+    __tablename__ = 'areas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(120), unique=True, nullable=False)  # normalized key, e.g. 'fc-road-pune'
+    name = db.Column(db.String(120), nullable=False)  # display name, e.g. 'FC Road, Pune'
+    locality = db.Column(db.String(100), nullable=False)
+    city = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    users = db.relationship('User', backref='area', lazy=True)
+    
+    def __repr__(self):
+        return f'<Area {self.slug}>'
+
+class AreaDailyTotal(db.Model):
+    __tablename__ = 'area_daily_totals'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'area_id', 'waste_type'),
+        db.Index('ix_area_daily_totals_area_day', 'area_id', 'day'),
+    )
+    
+    # Daily per-area totals of all disposals, hot and archived
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    area_id = db.Column(db.Integer, db.ForeignKey('areas.id'), nullable=False)
+    waste_type = db.Column(db.String(10), nullable=False)
+    disposal_count = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Float, nullable=False, default=0.0)
+    points_earned = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AreaDailyTotal {self.day} {self.area_id} {self.waste_type}>'
+
+class Bin(db.Model):
+    __tablename__ = 'bins'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    waste_type = db.Column(db.String(10), nullable=False)  # 'dry' or 'wet'
+    location = db.Column(db.String(255), nullable=False)
+    capacity_kg = db.Column(db.Float, nullable=False)
+    device_key = db.Column(db.String(100), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    fill_level = db.Column(db.Float, default=0.0)  # percent, last flushed value
+    current_weight = db.Column(db.Float, default=0.0)  # in kg, last flushed value
+    last_seen = db.Column(db.DateTime, nullable=True)
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    disposals = db.relationship('Disposal', backref='bin', lazy=True)
+    telemetry = db.relationship('BinTelemetry', backref='bin', lazy=True)
+    
+    def __repr__(self):
+        return f'<Bin {self.name} - {self.waste_type}>'
+
+class BinTelemetry(db.Model):
+    __tablename__ = 'bin_telemetry'
+    __table_args__ = (db.UniqueConstraint('bin_id', 'bucket_start'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bin_id = db.Column(db.Integer, db.ForeignKey('bins.id'), nullable=False, index=True)
+    bucket_start = db.Column(db.DateTime, nullable=False, index=True)
+    sample_count = db.Column(db.Integer, nullable=False)
+    fill_min = db.Column(db.Float, nullable=False)
+    fill_max = db.Column(db.Float, nullable=False)
+    fill_avg = db.Column(db.Float, nullable=False)
+    weight_min = db.Column(db.Float, nullable=False)
+    weight_max = db.Column(db.Float, nullable=False)
+    weight_avg = db.Column(db.Float, nullable=False)
+    
+    def __repr__(self):
+        return f'<BinTelemetry {self.bin_id} @ {self.bucket_start}>'
+
 class Reward(db.Model):
     __tablename__ = 'rewards'
     
@@ -42,6 +151,9 @@ class Reward(db.Model):
     description = db.Column(db.String(255), nullable=False)
     points_required = db.Column(db.Integer, nullable=False)
     active = db.Column(db.Boolean, default=True)
+    uses_vouchers = db.Column(db.Boolean, default=False)  # redemptions must claim a voucher code
+    low_stock_threshold = db.Column(db.Integer, nullable=True)  # overrides vouchers.VOUCHER_CONFIG
+    stock_alert_level = db.Column(db.Integer, default=0, nullable=False)  # last voucher stock alert: 0 none, 1 low, 2 empty
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -50,6 +162,33 @@ class Reward(db.Model):
     def __repr__(self):
         return f'<Reward {self.name}>'
 
+class RewardRule(db.Model):
+    __tablename__ = 'reward_rules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # see rules.RULE_KINDS
+    waste_type = db.Column(db.String(10), nullable=True)  # None applies to both bins
+    params = db.Column(db.Text, nullable=False)  # JSON, shape depends on kind
+    starts_at = db.Column(db.DateTime, nullable=True)
+    ends_at = db.Column(db.DateTime, nullable=True)
+    active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RewardRule {self.name} - {self.kind}>'
+
+class RewardRuleVersion(db.Model):
+    __tablename__ = 'reward_rule_versions'
+    
+    # Single row bumped on every rule change so workers know to recompile
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<RewardRuleVersion {self.version}>'
+
 class Redemption(db.Model):
     __tablename__ = 'redemptions'
     
@@ -62,6 +201,34 @@ class Redemption(db.Model):
     def __repr__(self):
         return f'<Redemption {self.id}>'
 
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    # Ids are never reused so they can serve as de-duplication keys downstream
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    kind = db.Column(db.SmallInteger, nullable=False)  # see event_log.EVENT_KINDS
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} - {self.kind}>'
+
+class VoucherCode(db.Model):
+    __tablename__ = 'voucher_codes'
+    __table_args__ = (db.Index('ix_voucher_codes_pool', 'reward_id', 'status'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    reward_id = db.Column(db.Integer, db.ForeignKey('rewards.id'), nullable=False)
+    code = db.Column(db.String(64), unique=True, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='available')  # 'available' or 'claimed'
+    redemption_id = db.Column(db.Integer, db.ForeignKey('redemptions.id'), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<VoucherCode {self.id} - {self.status}>'
+
 class Admin(db.Model):
     __tablename__ = 'admins'
     
@@ -0,0 +1,356 @@
+import io
+import os
+import csv
+import json
+import uuid
+import fcntl
+import zipfile
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import User
+from areas import parse_area, resolve_areas
+from utils import make_qr_image
+
+logger = logging.getLogger(__name__)
+
+# Bulk onboarding configuration
+ONBOARDING_CONFIG = {
+    'chunk_size': 1000,                    # CSV rows de-duplicated and inserted per transaction
+    'render_workers': os.cpu_count() or 2, # processes rendering QR codes
+    'render_batch_size': 50,               # QR codes per task sent to a render process
+    'output_dir': os.environ.get('IMPORT_DIR', '/tmp/waste_disposal_imports'),
+    'sheet_columns': 4,                    # QR codes per row on a PDF sheet
+    'sheet_rows': 5,                       # rows of QR codes per PDF page
+    'sheet_dpi': 150,                      # A4 page resolution
+    'pdf_pages_per_write': 50,             # pages buffered before they are appended to the PDF
+    'render_start_method': 'forkserver',   # render processes never fork the threaded server itself
+    'max_concurrent_imports': int(os.environ.get('MAX_CONCURRENT_IMPORTS', 1)),  # imports running at once per host
+}
+
+REQUIRED_COLUMNS = ['name', 'phone', 'address']
+
+# Column sizes in the users table
+FIELD_LIMITS = {'name': 100, 'phone': 15, 'address': 255}
+
+OUTPUT_FORMATS = {'zip': 'codes.zip', 'pdf': 'codes.pdf'}
+
+def render_qr_batch(entries):
+    """Render (user_id, qr_code, name, phone) entries to PNG files; runs in a render process"""
+    files = []
+    for user_id, qr_code, name, phone in entries:
+        buffer = io.BytesIO()
+        make_qr_image(qr_code).save(buffer)
+        files.append((f'user_{user_id}_{qr_code}.png', buffer.getvalue()))
+    return files
+
+def render_sheet(entries):
+    """Render one printable A4 page of labelled QR codes as PNG; runs in a render process"""
+    dpi = ONBOARDING_CONFIG['sheet_dpi']
+    columns, rows = ONBOARDING_CONFIG['sheet_columns'], ONBOARDING_CONFIG['sheet_rows']
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    margin = dpi // 3
+    cell_w, cell_h = (width - 2 * margin) // columns, (height - 2 * margin) // rows
+    label_h = dpi // 4
+
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default()
+    for i, (user_id, qr_code, name, phone) in enumerate(entries):
+        x = margin + (i % columns) * cell_w
+        y = margin + (i // columns) * cell_h
+        size = min(cell_w, cell_h - label_h) - 10
+        qr = make_qr_image(qr_code).get_image().convert('L').resize((size, size), Image.NEAREST)
+        page.paste(qr, (x + (cell_w - size) // 2, y))
+        draw.text((x + 10, y + size + 2), f'{name[:28]}', fill=0, font=font)
+        draw.text((x + 10, y + size + 2 + label_h // 2), f'{phone}  #{user_id}', fill=0, font=font)
+        draw.rectangle([x, y, x + cell_w - 1, y + cell_h - 1], outline=200)
+
+    buffer = io.BytesIO()
+    page.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class ZipOutput:
+    """Zip of QR PNGs plus a manifest CSV mapping files to users"""
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)  # PNGs are already compressed
+        self.manifest = io.StringIO()
+        self.writer = csv.writer(self.manifest)
+        self.writer.writerow(['user_id', 'name', 'phone', 'qr_code', 'file'])
+        self.per_task = ONBOARDING_CONFIG['render_batch_size']
+
+    def add(self, entries, submit):
+        for i in range(0, len(entries), self.per_task):
+            batch = entries[i:i + self.per_task]
+            yield batch, submit(render_qr_batch, batch)
+
+    def write(self, batch, files):
+        for (user_id, qr_code, name, phone), (filename, data) in zip(batch, files):
+            self.zip.writestr(filename, data)
+            self.writer.writerow([user_id, name, phone, qr_code, filename])
+        return len(files)
+
+    def flush(self, submit):
+        return []
+
+    def close(self):
+        self.zip.writestr('manifest.csv', self.manifest.getvalue())
+        self.zip.close()
+
+class PdfOutput:
+    """Printable PDF sheets, appended to the file in groups of pages to bound memory"""
+
+    def __init__(self, path):
+        self.path = path
+        self.per_page = ONBOARDING_CONFIG['sheet_columns'] * ONBOARDING_CONFIG['sheet_rows']
+        self.partial = []
+        self.pages = []
+        self.written = False
+
+    def add(self, entries, submit):
+        self.partial.extend(entries)
+        while len(self.partial) >= self.per_page:
+            page, self.partial = self.partial[:self.per_page], self.partial[self.per_page:]
+            yield page, submit(render_sheet, page)
+
+    def flush(self, submit):
+        if self.partial:
+            page, self.partial = self.partial, []
+            return [(page, submit(render_sheet, page))]
+        return []
+
+    def write(self, batch, data):
+        self.pages.append(Image.open(io.BytesIO(data)))
+        if len(self.pages) >= ONBOARDING_CONFIG['pdf_pages_per_write']:
+            self._save()
+        return len(batch)
+
+    def _save(self):
+        if not self.pages:
+            return
+        first, rest = self.pages[0], self.pages[1:]
+        first.save(self.path, 'PDF', save_all=True, append_images=rest, append=self.written,
+                   resolution=ONBOARDING_CONFIG['sheet_dpi'])
+        self.written = True
+        self.pages = []
+
+    def close(self):
+        self._save()
+
+class ImportProgress:
+    """Import status kept in a JSON file so any worker can report it"""
+
+    def __init__(self, directory):
+        self.path = Path(directory) / 'progress.json'
+        self.state = {
+            'status': 'running',
+            'rows_read': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'errors': 0,
+            'qr_rendered': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None
+        }
+
+    def update(self, **changes):
+        self.state.update(changes)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def read(directory):
+        try:
+            return json.loads((Path(directory) / 'progress.json').read_text())
+        except (OSError, ValueError):
+            return None
+
+def import_directory(import_id):
+    """Directory holding an import's upload, progress and output files"""
+    return Path(ONBOARDING_CONFIG['output_dir']) / import_id
+
+def acquire_import_slot():
+    """Take one of max_concurrent_imports slots shared by every process on the host
+
+    Slots are lock files in the output directory, so the limit holds across
+    server workers and the command line script. Returns the open lock file to
+    pass to release_import_slot, or None if every slot is taken.
+    """
+    directory = Path(ONBOARDING_CONFIG['output_dir'])
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(ONBOARDING_CONFIG['max_concurrent_imports']):
+        handle = open(directory / f'.slot-{i}.lock', 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except BlockingIOError:
+            handle.close()
+    return None
+
+def release_import_slot(handle):
+    fcntl.flock(handle, fcntl.LOCK_UN)
+    handle.close()
+
+def new_import():
+    import_id = uuid.uuid4().hex
+    directory = import_directory(import_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    return import_id, directory
+
+def _read_chunks(stream, chunk_size):
+    """Yield lists of (line number, row) from a CSV stream, checking the header first"""
+    reader = csv.DictReader(stream)
+    columns = {(c or '').strip().lower(): c for c in reader.fieldnames or []}
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, {c: (row.get(columns[c]) or '').strip() for c in REQUIRED_COLUMNS}))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _validate(row):
+    for field in REQUIRED_COLUMNS:
+        if not row[field]:
+            return f'{field} is required'
+        if len(row[field]) > FIELD_LIMITS[field]:
+            return f'{field} must be at most {FIELD_LIMITS[field]} characters'
+    return None
+
+def _user_rows(rows):
+    areas = {line: parse_area(row['address']) for line, row in rows}
+    area_ids = resolve_areas(areas.values())
+    return [{
+        'name': row['name'],
+        'phone': row['phone'],
+        'address': row['address'],
+        'area_id': area_ids[areas[line]['slug']] if areas[line] else None,
+        'qr_code': str(uuid.uuid4()),
+        'reward_points': 0,
+        'created_at': datetime.utcnow()
+    } for line, row in rows]
+
+def _insert_chunk(rows, fail):
+    """Insert a chunk of validated rows in one transaction; returns the inserted user rows with ids"""
+    try:
+        users = _user_rows(rows)
+        db.session.execute(User.__table__.insert(), users)
+    except IntegrityError:
+        # A phone was registered concurrently; fall back to one savepoint per row
+        db.session.rollback()
+        users = []
+        for (line, row), user in zip(rows, _user_rows(rows)):
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(User.__table__.insert(), [user])
+                users.append(user)
+            except IntegrityError:
+                fail(line, row, 'Phone number already registered')
+
+    ids = dict(db.session.query(User.qr_code, User.id).filter(User.qr_code.in_([u['qr_code'] for u in users])))
+    db.session.commit()
+    for user in users:
+        user['id'] = ids[user['qr_code']]
+    return users
+
+def import_users(stream, directory, output_format='zip', chunk_size=None, workers=None, on_progress=None):
+    """Register users from a CSV stream of name, phone and address columns
+
+    Rows are read and inserted in chunks, with one query per chunk to find
+    phones that are already registered. QR codes are rendered by a process
+    pool while the next chunk is inserted, into a zip of PNGs or a printable
+    PDF. Rejected rows are written to errors.csv with their line numbers.
+    Returns the final progress state.
+    """
+    chunk_size = chunk_size or ONBOARDING_CONFIG['chunk_size']
+    workers = workers or ONBOARDING_CONFIG['render_workers']
+    directory = Path(directory)
+    progress = ImportProgress(directory)
+    progress.update(format=output_format, codes_file=OUTPUT_FORMATS[output_format], errors_file='errors.csv')
+
+    errors_file = open(directory / 'errors.csv', 'w', newline='')
+    errors = csv.writer(errors_file)
+    errors.writerow(['line', 'name', 'phone', 'address', 'error'])
+    output = (ZipOutput if output_format == 'zip' else PdfOutput)(directory / OUTPUT_FORMATS[output_format])
+    state = progress.state
+
+    def fail(line, row, message):
+        errors.writerow([line, row['name'], row['phone'], row['address'], message])
+        state['errors'] += 1
+
+    try:
+        context = multiprocessing.get_context(ONBOARDING_CONFIG['render_start_method'])
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+
+            def drain(keep):
+                while len(pending) > keep or (pending and pending[0][1].done()):
+                    batch, future = pending.popleft()
+                    state['qr_rendered'] += output.write(batch, future.result())
+
+            seen = set()
+            for chunk in _read_chunks(stream, chunk_size):
+                state['rows_read'] += len(chunk)
+                valid = []
+                for line, row in chunk:
+                    error = _validate(row)
+                    if error is None and row['phone'] in seen:
+                        error = 'Duplicate phone in file'
+                        state['duplicates'] += 1
+                    if error:
+                        fail(line, row, error)
+                        continue
+                    seen.add(row['phone'])
+                    valid.append((line, row))
+
+                phones = [row['phone'] for _, row in valid]
+                registered = {p for (p,) in db.session.query(User.phone).filter(User.phone.in_(phones))} if phones else set()
+                for line, row in valid:
+                    if row['phone'] in registered:
+                        fail(line, row, 'Phone number already registered')
+                        state['duplicates'] += 1
+                valid = [(line, row) for line, row in valid if row['phone'] not in registered]
+
+                users = _insert_chunk(valid, fail) if valid else []
+                state['imported'] += len(users)
+
+                entries = [(u['id'], u['qr_code'], u['name'], u['phone']) for u in users]
+                pending.extend(output.add(entries, pool.submit))
+                drain(workers * 4)
+                errors_file.flush()
+                progress.update()
+                if on_progress:
+                    on_progress(state)
+
+            pending.extend(output.flush(pool.submit))
+            drain(0)
+
+        output.close()
+        progress.update(status='completed', finished_at=datetime.utcnow().isoformat())
+        logger.info(f"User import finished: {state['imported']} imported, {state['errors']} rejected")
+    except Exception as e:
+        db.session.rollback()
+        progress.update(status='failed', error=str(e), finished_at=datetime.utcnow().isoformat())
+        logger.error(f"Error importing users: {str(e)}")
+        raise
+    finally:
+        errors_file.close()
+
+    if on_progress:
+        on_progress(state)
+    return state
@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Query profiler configuration
+PROFILER_CONFIG = {
+    'slow_query_ms': float(os.environ.get('SLOW_QUERY_MS', 200)),  # log statements slower than this
+    'n_plus_one_threshold': 5,  # identical statement shapes per request flagged as N+1
+    'max_param_chars': 500,     # truncate logged parameters to this length
+}
+
+_local = threading.local()
+
+class QueryStats:
+    """Statement count, total time and per-shape counts for one request or block"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.time += elapsed
+        self.shapes[statement] += 1
+
+    def suspected_n_plus_one(self, threshold=None):
+        threshold = threshold or PROFILER_CONFIG['n_plus_one_threshold']
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+def _collectors():
+    collectors = list(getattr(_local, 'collectors', []))
+    if has_request_context() and 'db_stats' in g:
+        collectors.append(g.db_stats)
+    return collectors
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement even if it raises
+    context._query_start_time = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start_time
+
+    # Bound parameters are kept out of the statement text, so the text is its shape
+    for stats in _collectors():
+        stats.record(statement, elapsed)
+
+    if elapsed * 1000 >= PROFILER_CONFIG['slow_query_ms']:
+        params = repr(parameters)[:PROFILER_CONFIG['max_param_chars']]
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {statement} | params: {params}")
+
+def init_profiler(app):
+    """Track per-request query counts and time, flag N+1 patterns and add debug headers"""
+
+    @app.before_request
+    def start_query_stats():
+        g.db_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('db_stats', None)
+        if stats is None:
+            return response
+
+        for shape, n in stats.suspected_n_plus_one():
+            logger.warning(f"Suspected N+1 in {request.method} {request.path}: {n}x {shape}")
+
+        if app.debug or app.config.get('DB_PROFILE_HEADERS'):
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time'] = f'{stats.time * 1000:.2f}'
+        return response
+
+@contextmanager
+def count_queries():
+    """Collect statistics for every statement executed by this thread inside the block"""
+    stats = QueryStats()
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+def assert_query_budget(client, method, url, budget, **kwargs):
+    """Issue a request with a Flask test client and fail if it runs more than `budget` queries
+
+    Returns the response so callers can make further assertions.
+    """
+    with count_queries() as stats:
+        response = getattr(client, method.lower())(url, **kwargs)
+    if stats.count > budget:
+        repeated = ''.join(f'\n  {n}x {shape}' for shape, n in stats.suspected_n_plus_one(2))
+        raise AssertionError(f'{method.upper()} {url} ran {stats.count} queries, budget is {budget}{repeated}')
+    return response
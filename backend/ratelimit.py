@@ -0,0 +1,213 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from flask import g, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+logger = logging.getLogger(__name__)
+
+def _parse_limit(value):
+    """Parse '<requests>/<seconds>' into (refill rate per second, burst size)"""
+    requests, seconds = value.split('/')
+    return float(requests) / float(seconds), int(requests)
+
+# Rate limiting configuration; limits are '<requests>/<seconds>' and may be set per environment
+RATE_LIMIT_CONFIG = {
+    'enabled': os.environ.get('RATE_LIMITS_ENABLED', '1').lower() in ('1', 'true'),
+    'limits': {
+        'token': os.environ.get('RATE_LIMIT_TOKEN', '30/60'),   # per bearer token on device endpoints
+        'qr': os.environ.get('RATE_LIMIT_QR', '10/60'),         # per QR code on authentication
+        'ip': os.environ.get('RATE_LIMIT_IP', '120/60'),        # per client IP on public endpoints
+        'login': os.environ.get('RATE_LIMIT_LOGIN', '5/60'),    # per IP on admin login
+        'bin': os.environ.get('RATE_LIMIT_BIN', '60/60'),       # per device key on bin telemetry
+    },
+    'max_keys': 100000,  # buckets kept per limiter before the least recently used are evicted
+    'max_concurrent_requests': int(os.environ.get('MAX_CONCURRENT_REQUESTS', 15)),  # DB pool size + overflow
+    'shed_retry_after': 1,  # seconds clients are told to wait when load is shed
+    'trusted_proxies': int(os.environ.get('TRUSTED_PROXIES', 0)),  # reverse proxies in front of the app
+}
+
+class RateLimiter:
+    """Token buckets per key with O(1) checks and least-recently-used eviction
+
+    An evicted bucket behaves like a full one when its key returns, so memory
+    stays bounded at the cost of occasionally forgiving an idle client.
+    """
+
+    def __init__(self, name, limit, max_keys=None):
+        self.name = name
+        self.rate, self.burst = _parse_limit(limit)
+        self.max_keys = max_keys or RATE_LIMIT_CONFIG['max_keys']
+        self.buckets = OrderedDict()  # key -> [tokens, last refill time, rejecting]
+        self.lock = threading.Lock()
+        self.evicted = 0
+
+    def allow(self, key):
+        """Take one token for `key`; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [float(self.burst), now, False]
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                bucket[2] = False
+                return True, 0
+
+            first_rejection = not bucket[2]
+            bucket[2] = True
+            retry_after = (1 - bucket[0]) / self.rate
+        metrics.reject(self.name)
+        if first_rejection:
+            logger.warning(f"Rate limit '{self.name}' exceeded for {key}")
+        return False, retry_after
+
+class ConcurrencyLimiter:
+    """Caps in-flight requests per worker so excess load is shed instead of queueing on the DB pool"""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.in_flight >= self.max_concurrent:
+                return False
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+class RateLimitMetrics:
+    """Rejected request counters for this worker"""
+
+    def __init__(self):
+        self.rejected = Counter()
+        self.lock = threading.Lock()
+
+    def reject(self, name):
+        with self.lock:
+            self.rejected[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            rejected = dict(self.rejected)
+        return {
+            'rejected': rejected,
+            'limiters': {
+                name: {'keys': len(limiter.buckets), 'evicted': limiter.evicted}
+                for name, limiter in limiters.items()
+            },
+            'concurrency': {
+                'max': concurrency.max_concurrent,
+                'in_flight': concurrency.in_flight,
+                'peak': concurrency.peak
+            }
+        }
+
+metrics = RateLimitMetrics()
+limiters = {name: RateLimiter(name, limit) for name, limit in RATE_LIMIT_CONFIG['limits'].items()}
+concurrency = ConcurrencyLimiter(RATE_LIMIT_CONFIG['max_concurrent_requests'])
+
+# Key functions; each returns None when the request carries nothing to limit on
+
+def by_ip():
+    # The proxy's address unless init_proxy_fix trusts its X-Forwarded-For header
+    return request.remote_addr
+
+def _digest(value):
+    # Credentials are hashed so they never sit in memory or logs, and cost a fixed size per bucket
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+def by_token():
+    token = request.headers.get('Authorization')
+    return _digest(token) if token else None
+
+def by_header(name):
+    def key():
+        value = request.headers.get(name)
+        return _digest(value) if value else None
+    return key
+
+def by_json_field(field, prefix='', secret=False):
+    def key():
+        data = request.get_json(silent=True)
+        value = data.get(field) if isinstance(data, dict) else None
+        if not value:
+            return None
+        return prefix + (_digest(str(value)) if secret else str(value))
+    return key
+
+def too_many_requests(retry_after, error='Too many requests'):
+    response = jsonify({'error': error, 'retry_after': round(retry_after, 1)})
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response, 429
+
+def rate_limited(*checks):
+    """Reject a request with 429 when any (limiter name, key function) check is out of tokens
+
+    Apply above authentication decorators so rejected requests never reach the DB.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if RATE_LIMIT_CONFIG['enabled']:
+                for name, key_func in checks:
+                    key = key_func()
+                    if key is None:
+                        continue
+                    allowed, retry_after = limiters[name].allow(key)
+                    if not allowed:
+                        return too_many_requests(retry_after)
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+def init_load_shedding(app, exempt=('/api/health',)):
+    """Answer 503 with Retry-After once a worker has too many requests in flight"""
+
+    @app.before_request
+    def acquire_request_slot():
+        if not RATE_LIMIT_CONFIG['enabled'] or request.path in exempt:
+            return None
+        if not concurrency.acquire():
+            metrics.reject('concurrency')
+            response = jsonify({'error': 'Server is busy, please retry'})
+            response.headers['Retry-After'] = str(RATE_LIMIT_CONFIG['shed_retry_after'])
+            return response, 503
+        g.request_slot = True
+        return None
+
+    @app.teardown_request
+    def release_request_slot(exc):
+        if g.pop('request_slot', False):
+            concurrency.release()
+
+def init_proxy_fix(app, trusted_proxies=None):
+    """Take the client IP and scheme from X-Forwarded-* headers set by `trusted_proxies` reverse proxies
+
+    Without this every client behind a proxy shares the proxy's IP and its rate
+    limit buckets. Only enable it when the app is reachable solely through the
+    proxies, or clients could forge their IP.
+    """
+    trusted_proxies = RATE_LIMIT_CONFIG['trusted_proxies'] if trusted_proxies is None else trusted_proxies
+    if trusted_proxies > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
@@ -0,0 +1,158 @@
+import logging
+
+import numpy as np
+from sqlalchemy import bindparam, case, func, update
+
+from database import db
+from models import User, Disposal, DisposalSummary, Redemption
+
+logger = logging.getLogger(__name__)
+
+# Reconciliation configuration
+RECONCILE_CONFIG = {
+    'chunk_size': 50000,         # rows fetched per keyset-paginated query
+    'repair_batch_size': 1000,   # mismatched users re-checked and repaired per transaction
+}
+
+def stream_columns(id_column, columns, chunk_size):
+    """Yield chunks of a table as NumPy int64 arrays, paging on the primary key"""
+    last_id = None
+    while True:
+        query = db.session.query(id_column, *columns)
+        if last_id is not None:
+            query = query.filter(id_column > last_id)
+        rows = query.order_by(id_column).limit(chunk_size).all()
+        if not rows:
+            return
+        data = np.array(rows, dtype=np.int64).reshape(len(rows), len(columns) + 1)
+        last_id = int(data[-1, 0])
+        yield data
+        if len(rows) < chunk_size:
+            return
+
+def grouped_sum(totals, keys, values):
+    """Add values into totals[keys], growing the accumulator as larger keys appear"""
+    if len(keys) == 0:
+        return totals
+    size = max(int(keys.max()) + 1, len(totals))
+    if size > len(totals):
+        totals = np.concatenate([totals, np.zeros(size - len(totals), dtype=np.int64)])
+    # Per-chunk sums stay far below 2**53, so the float64 bincount is exact
+    totals += np.rint(np.bincount(keys, weights=values, minlength=size)).astype(np.int64)
+    return totals
+
+def expected_points(chunk_size=None):
+    """Per-user points implied by disposals (hot and archived) minus redemptions"""
+    chunk_size = chunk_size or RECONCILE_CONFIG['chunk_size']
+    totals = np.zeros(0, dtype=np.int64)
+    rows = 0
+
+    for data in stream_columns(Disposal.id, [Disposal.user_id, Disposal.points_earned], chunk_size):
+        totals = grouped_sum(totals, data[:, 1], data[:, 2])
+        rows += len(data)
+    for data in stream_columns(DisposalSummary.id, [DisposalSummary.user_id, DisposalSummary.points_earned], chunk_size):
+        totals = grouped_sum(totals, data[:, 1], data[:, 2])
+        rows += len(data)
+    for data in stream_columns(Redemption.id, [Redemption.user_id, Redemption.points_used], chunk_size):
+        totals = grouped_sum(totals, data[:, 1], -data[:, 2])
+        rows += len(data)
+
+    logger.info(f"Summed {rows} disposal and redemption rows for {np.count_nonzero(totals)} users")
+    return totals
+
+def find_mismatches(chunk_size=None):
+    """Yield (user_id, stored, expected) for every user whose balance disagrees with the ledger
+
+    NULL balances are reported as 0 but always count as a mismatch, so they are
+    repaired even when the ledger total is 0.
+    """
+    chunk_size = chunk_size or RECONCILE_CONFIG['chunk_size']
+    expected = expected_points(chunk_size)
+
+    columns = [func.coalesce(User.reward_points, 0), case((User.reward_points.is_(None), 1), else_=0)]
+    for data in stream_columns(User.id, columns, chunk_size):
+        user_ids = data[:, 0]
+        stored = data[:, 1]
+        want = np.zeros(len(user_ids), dtype=np.int64)
+        known = user_ids < len(expected)
+        want[known] = expected[user_ids[known]]
+        for i in np.nonzero((stored != want) | (data[:, 2] == 1))[0]:
+            yield int(user_ids[i]), int(stored[i]), int(want[i])
+
+def ledger_points(user_ids):
+    """Points implied by the ledger for the given users, summed in SQL"""
+    totals = dict.fromkeys(user_ids, 0)
+    queries = [
+        (db.session.query(Disposal.user_id, func.sum(Disposal.points_earned))
+         .filter(Disposal.user_id.in_(user_ids)).group_by(Disposal.user_id), 1),
+        (db.session.query(DisposalSummary.user_id, func.sum(DisposalSummary.points_earned))
+         .filter(DisposalSummary.user_id.in_(user_ids)).group_by(DisposalSummary.user_id), 1),
+        (db.session.query(Redemption.user_id, func.sum(Redemption.points_used))
+         .filter(Redemption.user_id.in_(user_ids)).group_by(Redemption.user_id), -1),
+    ]
+    for query, sign in queries:
+        for user_id, points in query:
+            totals[user_id] += sign * int(points or 0)
+    return totals
+
+def repair(mismatches, batch_size=None):
+    """Set balances to their expected values in bulk, returning the number of balances updated
+
+    The expected totals from find_mismatches are a snapshot taken before the
+    balances were read, so each batch is re-checked just before it is updated:
+    balances are read first, then the ledger is re-summed for those users, and
+    each update only applies if the balance still equals the value read. A
+    disposal or redemption that lands mid-run is therefore never overwritten;
+    users changed after the re-check are reported again on the next run.
+    """
+    batch_size = batch_size or RECONCILE_CONFIG['repair_batch_size']
+    statements = {
+        'set': update(User)
+        .where(User.id == bindparam('user_id'), User.reward_points == bindparam('stored'))
+        .values(reward_points=bindparam('expected'))
+        .execution_options(synchronize_session=False),
+        # `reward_points = NULL` never matches, so NULL balances need their own guard
+        'null': update(User)
+        .where(User.id == bindparam('user_id'), User.reward_points.is_(None))
+        .values(reward_points=bindparam('expected'))
+        .execution_options(synchronize_session=False),
+    }
+    repaired = 0
+    batch = []
+    try:
+        for user_id, _, _ in mismatches:
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                repaired += _apply(statements, batch)
+                batch = []
+        if batch:
+            repaired += _apply(statements, batch)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error repairing reward points: {str(e)}")
+        raise
+    return repaired
+
+def _apply(statements, user_ids):
+    """Re-check and repair one batch, returning the number of rows the guarded updates changed"""
+    stored = dict(db.session.query(User.id, User.reward_points).filter(User.id.in_(user_ids)))
+    expected = ledger_points(list(stored))
+    params = {'set': [], 'null': []}
+    for user_id, points in stored.items():
+        if points is None:
+            params['null'].append({'user_id': user_id, 'expected': expected[user_id]})
+        elif points != expected[user_id]:
+            params['set'].append({'user_id': user_id, 'stored': points, 'expected': expected[user_id]})
+
+    connection = db.session.connection()
+    repaired = 0
+    for kind, rows in params.items():
+        if not rows:
+            continue
+        # Rows skipped by the guard changed since the re-check and are not counted
+        if connection.dialect.supports_sane_multi_rowcount:
+            repaired += connection.execute(statements[kind], rows).rowcount
+        else:
+            repaired += sum(connection.execute(statements[kind], row).rowcount for row in rows)
+    db.session.commit()
+    return repaired
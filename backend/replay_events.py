@@ -0,0 +1,44 @@
+"""Script to rebuild counters and daily rollups from the disposal event log"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import argparse
+import json
+
+from event_log import EventLog, Consumer, rebuild_rollups, EVENT_LOG_CONFIG
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the disposal event log without touching the database')
+    parser.add_argument('--dir', default=EVENT_LOG_CONFIG['directory'], help='event log directory')
+    parser.add_argument('--from-offset', type=int, default=0, help='offset to start replaying from')
+    parser.add_argument('--consumer', help='resume from and commit the offset of this named consumer')
+    parser.add_argument('--output', help='write the rollups to this JSON file instead of stdout')
+    args = parser.parse_args()
+
+    log = EventLog(args.dir)
+    start = args.from_offset
+    consumer = None
+    if args.consumer:
+        consumer = Consumer(log, args.consumer)
+        start = consumer.offset
+
+    end = log.end_offset()
+    result = rebuild_rollups(log, start, end)
+    result['range'] = {'from_offset': start, 'to_offset': end}
+
+    if consumer:
+        consumer.pending = end
+        consumer.commit()
+
+    output = json.dumps(result, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        print(f"Replayed offsets {start}-{end} into {args.output}")
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import math
+import bisect
+import threading
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from database import db
+from models import RewardRule, RewardRuleVersion, Disposal
+from utils import REWARD_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Rules engine configuration
+RULES_CONFIG = {
+    'version_check_seconds': 5,  # how often workers look for a new rule version
+    'utc_offset_minutes': int(os.environ.get('REWARD_UTC_OFFSET_MINUTES', 330)),  # local time for hour rules
+}
+
+WASTE_TYPES = ['dry', 'wet']
+WASTE_INDEX = {waste_type: i for i, waste_type in enumerate(WASTE_TYPES)}
+
+# Required params per rule kind
+RULE_KINDS = {
+    'base_rate': ['points_per_kg'],
+    'time_multiplier': ['start_hour', 'end_hour', 'multiplier'],
+    'bin_bonus': ['bin_id'],  # optional multiplier and bonus_points
+    'weight_cap': ['max_kg'],
+    'streak_bonus': ['min_days', 'bonus_points'],
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def to_epoch(when):
+    return (when - EPOCH).total_seconds()
+
+# Params that index lookup tables or are added to points, so must be whole numbers
+INTEGER_PARAMS = ['start_hour', 'end_hour', 'bin_id', 'min_days', 'bonus_points']
+
+# Params multiplied into or added to points, so must be finite
+FLOAT_PARAMS = ['points_per_kg', 'multiplier', 'max_kg', 'bonus_points']
+
+def _is_integer(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    if isinstance(value, float):
+        return value.is_integer()
+    return isinstance(value, str) and value.strip().lstrip('-').isdigit()
+
+def validate_rule(kind, waste_type, params, starts_at=None, ends_at=None):
+    """Return an error message for an invalid rule definition, or None"""
+    if kind not in RULE_KINDS:
+        return f'kind must be one of {", ".join(RULE_KINDS)}'
+    if waste_type is not None and waste_type not in WASTE_INDEX:
+        return 'waste_type must be either "dry" or "wet"'
+    if not isinstance(params, dict):
+        return 'params must be an object'
+    for key in RULE_KINDS[kind]:
+        if key not in params:
+            return f'params.{key} is required for {kind} rules'
+    for key in INTEGER_PARAMS:
+        if key in params and not _is_integer(params[key]):
+            return f'params.{key} must be an integer'
+    if starts_at and ends_at and ends_at <= starts_at:
+        return 'ends_at must be after starts_at'
+    try:
+        for key in FLOAT_PARAMS:
+            if key in params and (isinstance(params[key], bool) or not math.isfinite(float(params[key]))):
+                return f'params.{key} must be a finite number'
+        if kind == 'time_multiplier':
+            if not (0 <= int(params['start_hour']) <= 23 and 0 <= int(params['end_hour']) <= 24):
+                return 'start_hour must be 0-23 and end_hour 0-24'
+            # An empty range is ambiguous (no hours or all day), so all-day multipliers use 0 and 24
+            if int(params['start_hour']) == int(params['end_hour']):
+                return 'start_hour and end_hour must differ; use 0 and 24 for all day'
+        if kind == 'weight_cap' and float(params['max_kg']) <= 0:
+            return 'max_kg must be greater than 0'
+        if kind == 'streak_bonus' and int(params['min_days']) < 1:
+            return 'min_days must be at least 1'
+        if kind == 'bin_bonus' and int(params['bin_id']) < 1:
+            return 'bin_id must be a positive integer'
+        for key in ['points_per_kg', 'multiplier', 'bonus_points']:
+            if key in params and float(params[key]) < 0:
+                return f'{key} must not be negative'
+    except (TypeError, ValueError):
+        return 'params must be numeric'
+    return None
+
+class CompiledRules:
+    """Rule set flattened into lookup arrays indexed by campaign interval, waste type, hour, bin and streak
+
+    Points are min(weight, cap) * rate * hour multiplier * bin multiplier,
+    truncated, plus the bin bonus and the bonus of the longest streak reached.
+    Campaign start/end times split the timeline into intervals in which the
+    set of active rules is constant, so evaluation is a handful of lookups.
+    """
+
+    def __init__(self, rules, version=0, utc_offset_minutes=None):
+        self.version = version
+        self.utc_offset = 60 * (utc_offset_minutes if utc_offset_minutes is not None
+                                else RULES_CONFIG['utc_offset_minutes'])
+        rules = sorted(rules, key=lambda r: r.id or 0)
+        parsed = [(r, json.loads(r.params) if isinstance(r.params, str) else r.params) for r in rules]
+
+        edges = set()
+        for r, _ in parsed:
+            if r.starts_at:
+                edges.add(to_epoch(r.starts_at))
+            if r.ends_at:
+                edges.add(to_epoch(r.ends_at))
+        self.boundaries = np.array(sorted(edges), dtype=np.float64)
+
+        self.bin_ids = np.array(sorted({int(p['bin_id']) for r, p in parsed if r.kind == 'bin_bonus'}), dtype=np.int64)
+        self.thresholds = np.array(sorted({int(p['min_days']) for r, p in parsed if r.kind == 'streak_bonus'}), dtype=np.int64)
+        self.max_streak = int(self.thresholds[-1]) if len(self.thresholds) else 0
+
+        n, w, nb, nt = len(self.boundaries) + 1, len(WASTE_TYPES), len(self.bin_ids), len(self.thresholds)
+        self.rate = np.tile(np.array([REWARD_CONFIG.get(t, 0) for t in WASTE_TYPES], dtype=np.float64), (n, 1))
+        self.cap = np.full((n, w), np.inf)
+        self.hour_multiplier = np.ones((n, w, 24))
+        self.bin_multiplier = np.ones((n, w, nb + 1))
+        self.bin_bonus = np.zeros((n, w, nb + 1), dtype=np.int64)
+        self.streak_bonus = np.zeros((n, w, nt + 1), dtype=np.int64)
+
+        # Streak rules go last in ascending min_days order so longer streaks overwrite shorter ones
+        ordered = ([rp for rp in parsed if rp[0].kind != 'streak_bonus']
+                   + sorted((rp for rp in parsed if rp[0].kind == 'streak_bonus'), key=lambda rp: int(rp[1]['min_days'])))
+        bounds = np.concatenate([[-np.inf], self.boundaries, [np.inf]])
+        for i in range(n):
+            for r, p in ordered:
+                if not self._covers(r, bounds[i], bounds[i + 1]):
+                    continue
+                targets = [WASTE_INDEX[r.waste_type]] if r.waste_type else list(range(w))
+                for t in targets:
+                    self._apply(i, t, r.kind, p)
+
+        # Plain-list copies keep the scalar path free of NumPy scalar overhead
+        self.lists = {name: getattr(self, name).tolist() for name in
+                      ['boundaries', 'bin_ids', 'thresholds', 'rate', 'cap', 'hour_multiplier',
+                       'bin_multiplier', 'bin_bonus', 'streak_bonus']}
+
+    @staticmethod
+    def _covers(rule, lo, hi):
+        starts = to_epoch(rule.starts_at) if rule.starts_at else -np.inf
+        ends = to_epoch(rule.ends_at) if rule.ends_at else np.inf
+        return starts <= lo and ends >= hi
+
+    def _apply(self, i, t, kind, p):
+        if kind == 'base_rate':
+            self.rate[i, t] = float(p['points_per_kg'])
+        elif kind == 'weight_cap':
+            self.cap[i, t] = min(self.cap[i, t], float(p['max_kg']))
+        elif kind == 'time_multiplier':
+            start, end = int(p['start_hour']), int(p['end_hour'])
+            hours = list(range(start, end)) if start < end else list(range(start, 24)) + list(range(0, end))
+            self.hour_multiplier[i, t, hours] *= float(p['multiplier'])
+        elif kind == 'bin_bonus':
+            j = int(np.searchsorted(self.bin_ids, int(p['bin_id'])))
+            self.bin_multiplier[i, t, j] *= float(p.get('multiplier', 1.0))
+            self.bin_bonus[i, t, j] += int(p.get('bonus_points', 0))
+        elif kind == 'streak_bonus':
+            j = int(np.searchsorted(self.thresholds, int(p['min_days']))) + 1
+            self.streak_bonus[i, t, j:] = int(p['bonus_points'])
+
+    def points(self, waste_type, weight, when=None, bin_id=None, streak_days=0):
+        """Points for a single disposal"""
+        t = WASTE_INDEX.get(waste_type)
+        if t is None:
+            return 0
+        lists = self.lists
+        ts = to_epoch(when or datetime.utcnow())
+        i = bisect.bisect_right(lists['boundaries'], ts)
+        hour = int((ts + self.utc_offset) // 3600 % 24)
+        bin_ids = lists['bin_ids']
+        j = len(bin_ids)
+        if bin_id is not None:
+            k = bisect.bisect_left(bin_ids, bin_id)
+            if k < len(bin_ids) and bin_ids[k] == bin_id:
+                j = k
+        s = bisect.bisect_right(lists['thresholds'], streak_days)
+
+        value = (min(weight, lists['cap'][i][t]) * lists['rate'][i][t]
+                 * lists['hour_multiplier'][i][t][hour] * lists['bin_multiplier'][i][t][j])
+        return int(value) + lists['bin_bonus'][i][t][j] + lists['streak_bonus'][i][t][s]
+
+    def points_batch(self, waste_types, weights, timestamps=None, bin_ids=None, streak_days=None):
+        """Points for many disposals at once; returns an int64 array
+
+        `timestamps` may be naive UTC datetimes or epoch seconds; missing bin ids
+        are given as -1 and missing streaks as 0.
+        """
+        waste_types = np.asarray(waste_types)
+        weights = np.asarray(weights, dtype=np.float64)
+        size = len(weights)
+
+        t = np.full(size, -1, dtype=np.int64)
+        for name, index in WASTE_INDEX.items():
+            t[waste_types == name] = index
+        valid = t >= 0
+        t[~valid] = 0
+
+        if timestamps is None:
+            ts = np.full(size, to_epoch(datetime.utcnow()))
+        else:
+            ts = np.asarray(timestamps)
+            if ts.dtype == object or np.issubdtype(ts.dtype, np.datetime64):
+                ts = ts.astype('datetime64[us]').astype(np.int64) / 1e6
+            ts = ts.astype(np.float64)
+        i = np.searchsorted(self.boundaries, ts, side='right')
+        hour = ((ts + self.utc_offset) // 3600 % 24).astype(np.int64)
+
+        j = np.full(size, len(self.bin_ids), dtype=np.int64)
+        if bin_ids is not None and len(self.bin_ids):
+            bin_ids = np.asarray(bin_ids, dtype=np.int64)
+            k = np.minimum(np.searchsorted(self.bin_ids, bin_ids), len(self.bin_ids) - 1)
+            found = self.bin_ids[k] == bin_ids
+            j[found] = k[found]
+
+        s = np.zeros(size, dtype=np.int64)
+        if streak_days is not None:
+            s = np.searchsorted(self.thresholds, np.asarray(streak_days, dtype=np.int64), side='right')
+
+        value = (np.minimum(weights, self.cap[i, t]) * self.rate[i, t]
+                 * self.hour_multiplier[i, t, hour] * self.bin_multiplier[i, t, j])
+        total = value.astype(np.int64) + self.bin_bonus[i, t, j] + self.streak_bonus[i, t, s]
+        return np.where(valid, total, 0)
+
+class RewardEngine:
+    """Compiled rule set shared by a worker, recompiled when the stored version changes
+
+    If a rule set fails to compile, the previous one stays in use and the
+    compilation is retried at the next version check.
+    """
+
+    def __init__(self):
+        self.compiled = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def current(self):
+        now = time.time()
+        if self.compiled is not None and now - self.last_check < RULES_CONFIG['version_check_seconds']:
+            return self.compiled
+        with self.lock:
+            if self.compiled is None or now - self.last_check >= RULES_CONFIG['version_check_seconds']:
+                version = db.session.query(RewardRuleVersion.version).filter_by(id=1).scalar() or 0
+                if self.compiled is None or self.compiled.version != version:
+                    self.compiled = self._compile(version)
+                self.last_check = now
+        return self.compiled
+
+    def _compile(self, version):
+        rules = RewardRule.query.filter_by(active=True).all()
+        try:
+            compiled = CompiledRules(rules, version)
+        except Exception as e:
+            if self.compiled is not None:
+                logger.error(f"Error compiling reward rules (version {version}), "
+                             f"keeping version {self.compiled.version}: {str(e)}")
+                return self.compiled
+            # Nothing to fall back on yet, so use the default rates until the rules are fixed
+            logger.error(f"Error compiling reward rules (version {version}), using default rates: {str(e)}")
+            return CompiledRules([], version=None)
+        logger.info(f"Compiled {len(rules)} reward rules (version {version})")
+        return compiled
+
+    def points(self, waste_type, weight, when=None, bin_id=None, streak_days=0):
+        return self.current().points(waste_type, weight, when, bin_id, streak_days)
+
+    def points_batch(self, waste_types, weights, timestamps=None, bin_ids=None, streak_days=None):
+        return self.current().points_batch(waste_types, weights, timestamps, bin_ids, streak_days)
+
+    def invalidate(self):
+        """Check for a new version on the next call, keeping the current rules until it compiles"""
+        self.last_check = 0.0
+
+def bump_version():
+    """Increment the rule version in the current transaction"""
+    row = RewardRuleVersion.query.get(1)
+    if row is None:
+        db.session.add(RewardRuleVersion(id=1, version=1))
+    else:
+        row.version = RewardRuleVersion.version + 1
+
+def seed_default_rules():
+    """Create base-rate rules from REWARD_CONFIG if no rules exist yet"""
+    if RewardRule.query.first():
+        return
+    for waste_type, points_per_kg in REWARD_CONFIG.items():
+        db.session.add(RewardRule(
+            name=f'{waste_type.capitalize()} waste base rate',
+            kind='base_rate',
+            waste_type=waste_type,
+            params=json.dumps({'points_per_kg': points_per_kg})
+        ))
+    bump_version()
+    logger.info("Default reward rules created")
+
+def current_streak(user_id, when=None):
+    """Consecutive days, including today, on which the user has disposed waste"""
+    max_days = reward_engine.current().max_streak
+    if not max_days:
+        return 0
+    today = (when or datetime.utcnow()).date()
+    since = datetime.combine(today - timedelta(days=max_days), datetime.min.time())
+    days = {
+        str(day)[:10]
+        for (day,) in db.session.query(func.date(Disposal.timestamp)).filter(
+            Disposal.user_id == user_id,
+            Disposal.timestamp >= since
+        ).distinct()
+    }
+    streak = 1
+    while streak < max_days and (today - timedelta(days=streak)).isoformat() in days:
+        streak += 1
+    return streak
+
+reward_engine = RewardEngine()
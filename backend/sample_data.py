@@ -7,6 +7,8 @@ sys.path.insert(0, os.path.dirname(__file__))
 from flask import Flask
 from database import db, init_db
 from models import User, Disposal, Reward, Admin
+from utils import calculate_reward_points
+from areas import assign_area, rebuild_area_totals
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 import random
@@ -35,6 +37,7 @@ def populate_sample_data():
         for user_data in users_data:
             user = User(**user_data)
             db.session.add(user)
+            assign_area(user)
             users.append(user)
         
         db.session.commit()
@@ -56,13 +59,13 @@ def populate_sample_data():
                 waste_type = random.choice(['dry', 'wet'])
                 weight = round(random.uniform(0.5, 5.0), 2)
                 
-                # Calculate points based on waste type
-                points = int(weight * (15 if waste_type == 'dry' else 10))
-                
                 # Random timestamp in last 30 days
                 days_ago = random.randint(0, 30)
                 timestamp = datetime.utcnow() - timedelta(days=days_ago)
                 
+                # Calculate points using the active reward rules
+                points = calculate_reward_points(waste_type, weight, timestamp)
+                
                 disposal = Disposal(
                     user_id=user.id,
                     waste_type=waste_type,
@@ -78,6 +81,9 @@ def populate_sample_data():
         db.session.commit()
         print(f"Created {disposals_created} sample disposal records")
         
+        rebuild_area_totals()
+        print("Built per-area daily totals")
+        
         print("\n=== SAMPLE DATA SUMMARY ===")
         print(f"Total Users: {User.query.count()}")
         print(f"Total Disposals: {Disposal.query.count()}")
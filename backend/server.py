@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
@@ -8,11 +8,31 @@ from datetime import datetime, timedelta
 import jwt
 from functools import wraps
 import hashlib
+import json
+import math
+import re
+import threading
+import time
 
 # Import database and models
 from database import db, init_db
-from models import User, Disposal, Reward, Redemption, Admin
+from models import User, Disposal, Reward, Redemption, Admin, Bin, BinTelemetry, RewardRule, Area
 from utils import generate_qr_code, calculate_reward_points
+from telemetry import telemetry_store, parse_timestamp, TELEMETRY_CONFIG
+from event_log import disposal_event, outbox_relay
+from archival import disposal_totals, user_totals, archived_disposals
+from rules import reward_engine, current_streak, validate_rule, bump_version
+from profiler import init_profiler
+from live_feed import live_feed
+from cache import cache
+from vouchers import (import_codes, generate_codes, redeem, check_low_stock, stock_report, stock_reports,
+                      INSUFFICIENT_POINTS, OUT_OF_STOCK)
+from areas import assign_area, record_disposal, find_area, area_totals, area_daily
+from onboarding import import_users, new_import, import_directory, acquire_import_slot, release_import_slot, ImportProgress, OUTPUT_FORMATS
+from ratelimit import (rate_limited, by_ip, by_token, by_header, by_json_field, init_load_shedding, init_proxy_fix,
+                       metrics as rate_limit_metrics, RATE_LIMIT_CONFIG)
+from sqlalchemy import func
+from sqlalchemy.orm import make_transient_to_detached
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -24,10 +44,26 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['DB_PROFILE_HEADERS'] = os.environ.get('DB_PROFILE_HEADERS', '').lower() in ('1', 'true')
 
 # Initialize database
 db.init_app(app)
 
+# Per-request query counting, slow query logging and N+1 detection
+init_profiler(app)
+
+# Relay committed outbox rows into the event log in the background
+outbox_relay.init_app(app, on_relayed=live_feed.wake)
+
+# Flush buffered bin telemetry in the background and at exit
+telemetry_store.init_app(app)
+
+# Shed load with 503 before requests pile up waiting for DB connections
+init_load_shedding(app)
+
+# Use the client IP forwarded by the reverse proxy (TRUSTED_PROXIES) for per-IP limits
+init_proxy_fix(app)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,6 +75,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Seconds a user or admin row is served from the cache during authentication
+PRINCIPAL_TTL = 60
+
+# Seconds admin statistics and reports are served from the cache
+REPORT_TTL = 30
+
+def load_principal(model, principal_id):
+    """Load a user or admin, rebuilding it from the cache without a query when possible
+
+    Only a shared cache backend is used: with the per-process memory backend a
+    balance change would drop the cached row in one worker and leave it stale in
+    the others.
+    """
+    if not cache.shared:
+        return model.query.get(principal_id)
+    key = f'{model.__tablename__}:{principal_id}'
+    row = cache.get('principals', key)
+    if row is None:
+        principal = model.query.get(principal_id)
+        if principal:
+            cache.set('principals', key, {
+                c.name: getattr(principal, c.name)
+                for c in model.__table__.columns if c.name != 'password_hash'
+            }, PRINCIPAL_TTL)
+        return principal
+    
+    # Attach as a persistent instance; attributes left out above load on access
+    principal = model(**row)
+    make_transient_to_detached(principal)
+    return db.session.merge(principal, load=False)
+
 # Authentication decorator for users
 def token_required(f):
     @wraps(f)
@@ -51,7 +118,7 @@ def token_required(f):
             if token.startswith('Bearer '):
                 token = token[7:]
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
+            current_user = load_principal(User, data['user_id'])
             if not current_user:
                 return jsonify({'error': 'User not found'}), 401
         except jwt.ExpiredSignatureError:
@@ -63,10 +130,17 @@ def token_required(f):
     return decorated
 
 # Authentication decorator for admins
-def admin_required(f):
+def admin_required(f=None, allow_query_token=False):
+    # EventSource clients cannot set headers, so streaming endpoints opt in to ?token=;
+    # everywhere else a token in the URL would end up in access logs and browser history
+    if f is None:
+        return lambda f: admin_required(f, allow_query_token)
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
+        if not token and allow_query_token:
+            token = request.args.get('token')
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
         
@@ -74,7 +148,7 @@ def admin_required(f):
             if token.startswith('Bearer '):
                 token = token[7:]
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_admin = Admin.query.get(data['admin_id'])
+            current_admin = load_principal(Admin, data['admin_id'])
             if not current_admin:
                 return jsonify({'error': 'Admin not found'}), 401
         except jwt.ExpiredSignatureError:
@@ -85,6 +159,17 @@ def admin_required(f):
         return f(current_admin, *args, **kwargs)
     return decorated
 
+def resolve_bin(bin_id, waste_type):
+    """Look up an optional bin and check it accepts the given waste type"""
+    if bin_id is None:
+        return None, None
+    bin_ = Bin.query.get(int(bin_id))
+    if not bin_ or not bin_.active:
+        return None, (jsonify({'error': 'Bin not found'}), 404)
+    if bin_.waste_type != waste_type:
+        return None, (jsonify({'error': f'Bin {bin_.id} only accepts {bin_.waste_type} waste'}), 400)
+    return bin_, None
+
 # ==================== USER ENDPOINTS ====================
 
 @app.route('/api/health', methods=['GET'])
@@ -93,6 +178,7 @@ def health_check():
     return jsonify({'status': 'healthy', 'message': 'Smart Waste Disposal API is running'}), 200
 
 @app.route('/api/users/register', methods=['POST'])
+@rate_limited(('ip', by_ip))
 def register_user():
     """Register a new user and generate QR code"""
     try:
@@ -116,6 +202,7 @@ def register_user():
         )
         
         db.session.add(user)
+        assign_area(user)
         db.session.commit()
         
         # Generate QR code
@@ -131,6 +218,7 @@ def register_user():
                 'phone': user.phone,
                 'qr_code': user.qr_code,
                 'qr_code_path': qr_code_path,
+                'area_id': user.area_id,
                 'reward_points': user.reward_points
             }
         }), 201
@@ -141,6 +229,7 @@ def register_user():
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/users/authenticate', methods=['POST'])
+@rate_limited(('ip', by_ip), ('qr', by_json_field('qr_code', secret=True)))
 def authenticate_user():
     """Authenticate user with QR code"""
     try:
@@ -182,6 +271,7 @@ def authenticate_user():
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/bin/unlock', methods=['POST'])
+@rate_limited(('token', by_token))
 @token_required
 def unlock_bin(current_user):
     """Unlock the correct bin based on waste type"""
@@ -196,20 +286,29 @@ def unlock_bin(current_user):
         if waste_type not in ['dry', 'wet']:
             return jsonify({'error': 'waste_type must be either "dry" or "wet"'}), 400
         
-        logger.info(f"Bin unlock requested by {current_user.name} for {waste_type} waste")
+        bin_, error = resolve_bin(data.get('bin_id'), waste_type)
+        if error:
+            return error
+        
+        logger.info(f"Bin unlock requested by {current_user.name} for {waste_type} waste"
+                    + (f" at bin {bin_.id}" if bin_ else ""))
         
         return jsonify({
             'message': f'{waste_type.capitalize()} bin unlocked successfully',
             'waste_type': waste_type,
+            'bin_id': bin_.id if bin_ else None,
             'user': current_user.name,
             'instruction': f'Please dispose your {waste_type} waste now'
         }), 200
     
+    except ValueError:
+        return jsonify({'error': 'Invalid bin_id value'}), 400
     except Exception as e:
         logger.error(f"Error unlocking bin: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/disposal/log', methods=['POST'])
+@rate_limited(('token', by_token))
 @token_required
 def log_disposal(current_user):
     """Log waste disposal event and calculate rewards"""
@@ -231,22 +330,39 @@ def log_disposal(current_user):
         if weight <= 0:
             return jsonify({'error': 'weight must be greater than 0'}), 400
         
+        bin_, error = resolve_bin(data.get('bin_id'), waste_type)
+        if error:
+            return error
+        
         # Calculate reward points
-        points_earned = calculate_reward_points(waste_type, weight)
+        now = datetime.utcnow()
+        streak_days = current_streak(current_user.id, now)
+        points_earned = calculate_reward_points(waste_type, weight, now, bin_.id if bin_ else None, streak_days)
         
         # Create disposal record
         disposal = Disposal(
             user_id=current_user.id,
+            bin_id=bin_.id if bin_ else None,
             waste_type=waste_type,
             weight=weight,
-            points_earned=points_earned
+            points_earned=points_earned,
+            timestamp=now
         )
         
-        # Update user reward points
-        current_user.reward_points += points_earned
+        # Update user reward points in SQL so a stale cached balance cannot be written back
+        current_user.reward_points = User.reward_points + points_earned
         
         db.session.add(disposal)
+        db.session.flush()
+        
+        # Keep the per-area daily totals in step with the disposal
+        record_disposal(current_user.id, now, waste_type, weight, points_earned)
+        
+        # Record the event in the outbox within the same transaction
+        db.session.add(disposal_event(disposal))
         db.session.commit()
+        cache.delete('principals', f'users:{current_user.id}')
+        outbox_relay.wake()
         
         logger.info(f"Disposal logged: User {current_user.name}, {waste_type} waste, {weight}kg, {points_earned} points")
         
@@ -254,6 +370,7 @@ def log_disposal(current_user):
             'message': 'Disposal logged successfully',
             'disposal': {
                 'id': disposal.id,
+                'bin_id': disposal.bin_id,
                 'waste_type': disposal.waste_type,
                 'weight': disposal.weight,
                 'points_earned': disposal.points_earned,
@@ -263,7 +380,7 @@ def log_disposal(current_user):
         }), 201
     
     except ValueError:
-        return jsonify({'error': 'Invalid weight value'}), 400
+        return jsonify({'error': 'Invalid weight or bin_id value'}), 400
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error logging disposal: {str(e)}")
@@ -274,12 +391,13 @@ def log_disposal(current_user):
 def get_user_profile(current_user):
     """Get user profile and statistics"""
     try:
-        disposals = Disposal.query.filter_by(user_id=current_user.id).all()
+        totals = disposal_totals(user_id=current_user.id)
         redemptions = Redemption.query.filter_by(user_id=current_user.id).all()
         
-        total_waste = sum(d.weight for d in disposals)
-        dry_waste = sum(d.weight for d in disposals if d.waste_type == 'dry')
-        wet_waste = sum(d.weight for d in disposals if d.waste_type == 'wet')
+        total_disposals = sum(t['count'] for t in totals.values())
+        total_waste = sum(t['weight'] for t in totals.values())
+        dry_waste = totals['dry']['weight']
+        wet_waste = totals['wet']['weight']
         
         return jsonify({
             'user': {
@@ -292,7 +410,7 @@ def get_user_profile(current_user):
                 'created_at': current_user.created_at.isoformat()
             },
             'statistics': {
-                'total_disposals': len(disposals),
+                'total_disposals': total_disposals,
                 'total_waste_kg': round(total_waste, 2),
                 'dry_waste_kg': round(dry_waste, 2),
                 'wet_waste_kg': round(wet_waste, 2),
@@ -309,15 +427,14 @@ def get_user_profile(current_user):
 def get_available_rewards(current_user):
     """Get available rewards for redemption"""
     try:
-        rewards = Reward.query.filter_by(active=True).all()
-        
-        reward_list = [{
+        rewards = cache.get_or_compute('rewards', 'active', lambda: [{
             'id': r.id,
             'name': r.name,
             'description': r.description,
-            'points_required': r.points_required,
-            'can_redeem': current_user.reward_points >= r.points_required
-        } for r in rewards]
+            'points_required': r.points_required
+        } for r in Reward.query.filter_by(active=True).all()])
+        
+        reward_list = [dict(r, can_redeem=current_user.reward_points >= r['points_required']) for r in rewards]
         
         return jsonify({
             'current_points': current_user.reward_points,
@@ -346,21 +463,17 @@ def redeem_reward(current_user):
         if not reward.active:
             return jsonify({'error': 'Reward is not available'}), 400
         
-        if current_user.reward_points < reward.points_required:
+        outcome, redemption, voucher_code = redeem(current_user.id, reward)
+        if outcome == INSUFFICIENT_POINTS:
             return jsonify({'error': 'Insufficient points'}), 400
+        if outcome == OUT_OF_STOCK:
+            return jsonify({'error': 'Reward is out of stock'}), 409
         
-        # Create redemption record
-        redemption = Redemption(
-            user_id=current_user.id,
-            reward_id=reward.id,
-            points_used=reward.points_required
-        )
+        cache.delete('principals', f'users:{current_user.id}')
+        outbox_relay.wake()
         
-        # Deduct points from user
-        current_user.reward_points -= reward.points_required
-        
-        db.session.add(redemption)
-        db.session.commit()
+        if reward.uses_vouchers:
+            check_low_stock(reward)
         
         logger.info(f"Reward redeemed: User {current_user.name}, Reward {reward.name}")
         
@@ -370,6 +483,7 @@ def redeem_reward(current_user):
                 'id': redemption.id,
                 'reward_name': reward.name,
                 'points_used': redemption.points_used,
+                'voucher_code': voucher_code,
                 'timestamp': redemption.timestamp.isoformat()
             },
             'remaining_points': current_user.reward_points
@@ -380,9 +494,75 @@ def redeem_reward(current_user):
         logger.error(f"Error redeeming reward: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+# ==================== BIN ENDPOINTS ====================
+
+@app.route('/api/bins/<int:bin_id>/telemetry', methods=['POST'])
+@rate_limited(('bin', by_header('X-Bin-Key')))
+def ingest_bin_telemetry(bin_id):
+    """Ingest fill-level and weight sensor readings from a bin"""
+    try:
+        if not telemetry_store.check_device_key(bin_id, request.headers.get('X-Bin-Key')):
+            return jsonify({'error': 'Invalid bin or device key'}), 401
+        
+        data = request.get_json()
+        batch = 'samples' in data
+        samples = data['samples'] if batch else [data]
+        
+        if not isinstance(samples, list) or not samples:
+            return jsonify({'error': 'samples must be a non-empty list'}), 400
+        if len(samples) > TELEMETRY_CONFIG['max_batch_samples']:
+            return jsonify({'error': f"At most {TELEMETRY_CONFIG['max_batch_samples']} samples per request"}), 400
+        
+        now = time.time()
+        readings = []
+        for sample in samples:
+            if not isinstance(sample, dict):
+                return jsonify({'error': 'Each sample must be an object'}), 400
+            if sample.get('fill_level') is None or sample.get('weight') is None:
+                return jsonify({'error': 'fill_level and weight are required'}), 400
+            
+            fill_level = float(sample['fill_level'])
+            weight = float(sample['weight'])
+            
+            if not math.isfinite(fill_level) or not math.isfinite(weight):
+                return jsonify({'error': 'fill_level and weight must be finite numbers'}), 400
+            if fill_level < 0 or fill_level > 100:
+                return jsonify({'error': 'fill_level must be between 0 and 100'}), 400
+            if weight < 0:
+                return jsonify({'error': 'weight must not be negative'}), 400
+            
+            # Batched samples were taken at different times, so each must say when
+            if sample.get('timestamp') is not None:
+                timestamp = parse_timestamp(sample['timestamp'])
+            elif len(samples) > 1:
+                return jsonify({'error': 'timestamp is required for each sample in a batch'}), 400
+            else:
+                timestamp = now
+            if not now - TELEMETRY_CONFIG['max_sample_age'] <= timestamp <= now + TELEMETRY_CONFIG['max_clock_skew']:
+                return jsonify({'error': 'timestamp must be within the last hour and not in the future'}), 400
+            
+            readings.append((timestamp, fill_level, weight))
+        
+        if any(later[0] < earlier[0] for earlier, later in zip(readings, readings[1:])):
+            return jsonify({'error': 'samples must be in time order'}), 400
+        
+        # Flushing happens in the background, so a DB outage never fails ingestion
+        accepted = telemetry_store.ingest_batch(bin_id, readings)
+        
+        return jsonify({'message': 'Telemetry accepted', 'samples': accepted,
+                        'skipped': len(readings) - accepted}), 202
+    
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid telemetry values'}), 400
+    except Exception as e:
+        logger.error(f"Error ingesting bin telemetry: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 # ==================== ADMIN ENDPOINTS ====================
 
 @app.route('/api/admin/login', methods=['POST'])
+# Limited per IP only; a per-username limit would let anyone lock the admin out
+@rate_limited(('login', by_ip))
 def admin_login():
     """Admin login"""
     try:
@@ -427,20 +607,21 @@ def get_all_users(current_admin):
     """Get all users with their statistics"""
     try:
         users = User.query.all()
+        totals = user_totals()
         
         user_list = []
         for user in users:
-            disposals = Disposal.query.filter_by(user_id=user.id).all()
-            total_waste = sum(d.weight for d in disposals)
+            user_total = totals.get(user.id, {'count': 0, 'weight': 0.0})
             
             user_list.append({
                 'id': user.id,
                 'name': user.name,
                 'phone': user.phone,
                 'address': user.address,
+                'area_id': user.area_id,
                 'reward_points': user.reward_points,
-                'total_disposals': len(disposals),
-                'total_waste_kg': round(total_waste, 2),
+                'total_disposals': user_total['count'],
+                'total_waste_kg': round(user_total['weight'], 2),
                 'created_at': user.created_at.isoformat()
             })
         
@@ -450,6 +631,116 @@ def get_all_users(current_admin):
         logger.error(f"Error fetching users: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def run_user_import(import_id, output_format, slot):
+    """Import an uploaded CSV in the background; progress is reported through the import directory"""
+    directory = import_directory(import_id)
+    with app.app_context():
+        try:
+            with open(directory / 'upload.csv', newline='', encoding='utf-8-sig') as stream:
+                import_users(stream, directory, output_format)
+        except Exception as e:
+            logger.error(f"User import {import_id} failed: {str(e)}")
+        finally:
+            db.session.remove()
+            release_import_slot(slot)
+
+@app.route('/api/admin/users/import', methods=['POST'])
+@admin_required
+def start_user_import(current_admin):
+    """Start a bulk user import from a CSV of name, phone and address"""
+    try:
+        output_format = request.args.get('format', 'zip').lower()
+        if output_format not in OUTPUT_FORMATS:
+            return jsonify({'error': 'format must be either "zip" or "pdf"'}), 400
+        
+        upload = request.files.get('file')
+        if upload is None and request.mimetype != 'text/csv':
+            return jsonify({'error': 'CSV file is required'}), 400
+        
+        # Each import runs a pool of render processes, so only a few may run at once
+        slot = acquire_import_slot()
+        if slot is None:
+            return jsonify({'error': 'Too many imports running, retry once one has finished'}), 429
+        
+        try:
+            # Stream the upload to disk so large files are never held in memory
+            import_id, directory = new_import()
+            if upload is not None:
+                upload.save(directory / 'upload.csv')
+            else:
+                with open(directory / 'upload.csv', 'wb') as f:
+                    while True:
+                        block = request.stream.read(64 * 1024)
+                        if not block:
+                            break
+                        f.write(block)
+            
+            # Written before the thread starts so the status URL works as soon as it is returned
+            ImportProgress(directory).update(format=output_format)
+            threading.Thread(target=run_user_import, args=(import_id, output_format, slot),
+                             name=f'user-import-{import_id}', daemon=True).start()
+        except Exception:
+            release_import_slot(slot)
+            raise
+        
+        logger.info(f"User import {import_id} started by {current_admin.username}")
+        
+        return jsonify({
+            'message': 'User import started',
+            'import_id': import_id,
+            'status_url': f'/api/admin/users/imports/{import_id}'
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error starting user import: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def find_import(import_id):
+    """Directory and progress of an import, or None if the id is unknown"""
+    if not re.fullmatch(r'[0-9a-f]{32}', import_id):
+        return None, None
+    directory = import_directory(import_id)
+    return directory, ImportProgress.read(directory)
+
+@app.route('/api/admin/users/imports/<import_id>', methods=['GET'])
+@admin_required
+def get_user_import(current_admin, import_id):
+    """Get the progress of a bulk user import"""
+    try:
+        directory, progress = find_import(import_id)
+        if progress is None:
+            return jsonify({'error': 'Import not found'}), 404
+        
+        progress['import_id'] = import_id
+        if progress['status'] == 'completed':
+            progress['codes_url'] = f'/api/admin/users/imports/{import_id}/codes'
+            progress['errors_url'] = f'/api/admin/users/imports/{import_id}/errors'
+        
+        return jsonify(progress), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching user import: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/users/imports/<import_id>/<kind>', methods=['GET'])
+@admin_required
+def download_user_import(current_admin, import_id, kind):
+    """Download the QR codes or the rejected rows of a finished import"""
+    try:
+        directory, progress = find_import(import_id)
+        if progress is None or kind not in ('codes', 'errors'):
+            return jsonify({'error': 'Import not found'}), 404
+        if progress['status'] != 'completed':
+            return jsonify({'error': f"Import is {progress['status']}"}), 409
+        
+        filename = progress['codes_file'] if kind == 'codes' else progress['errors_file']
+        return send_file(directory / filename, as_attachment=True,
+                         download_name=f'import_{import_id}_{filename}')
+    
+    except Exception as e:
+        logger.error(f"Error downloading user import: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.route('/api/admin/disposals', methods=['GET'])
 @admin_required
 def get_all_disposals(current_admin):
@@ -461,27 +752,40 @@ def get_all_disposals(current_admin):
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
+        start_date = datetime.fromisoformat(start_date) if start_date else None
+        end_date = datetime.fromisoformat(end_date) if end_date else None
+        waste_type = waste_type.lower() if waste_type else None
+        
         query = Disposal.query
         
         # Apply filters
         if user_id:
             query = query.filter_by(user_id=user_id)
         if waste_type:
-            query = query.filter_by(waste_type=waste_type.lower())
+            query = query.filter_by(waste_type=waste_type)
         if start_date:
-            query = query.filter(Disposal.timestamp >= datetime.fromisoformat(start_date))
+            query = query.filter(Disposal.timestamp >= start_date)
         if end_date:
-            query = query.filter(Disposal.timestamp <= datetime.fromisoformat(end_date))
+            query = query.filter(Disposal.timestamp <= end_date)
         
         disposals = query.order_by(Disposal.timestamp.desc()).all()
         
+        # Span the archive when the date range reaches archived disposals
+        archived = archived_disposals(user_id, waste_type, start_date, end_date)
+        if archived:
+            disposals = sorted(disposals + archived, key=lambda d: d.timestamp, reverse=True)
+        
+        # One query for every user name instead of one per disposal
+        user_ids = {disposal.user_id for disposal in disposals}
+        user_names = dict(db.session.query(User.id, User.name).filter(User.id.in_(user_ids))) if user_ids else {}
+        
         disposal_list = []
         for disposal in disposals:
-            user = User.query.get(disposal.user_id)
             disposal_list.append({
                 'id': disposal.id,
                 'user_id': disposal.user_id,
-                'user_name': user.name if user else 'Unknown',
+                'user_name': user_names.get(disposal.user_id, 'Unknown'),
+                'bin_id': disposal.bin_id,
                 'waste_type': disposal.waste_type,
                 'weight': disposal.weight,
                 'points_earned': disposal.points_earned,
@@ -494,44 +798,201 @@ def get_all_disposals(current_admin):
         logger.error(f"Error fetching disposals: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def build_statistics():
+    """Compute overall waste collection statistics"""
+    total_users = User.query.count()
+    
+    totals = disposal_totals()
+    total_disposals = sum(t['count'] for t in totals.values())
+    total_waste = sum(t['weight'] for t in totals.values())
+    dry_waste = totals['dry']['weight']
+    wet_waste = totals['wet']['weight']
+    total_points_distributed = sum(t['points'] for t in totals.values())
+    
+    total_redemptions = Redemption.query.count()
+    total_points_redeemed = sum(r.points_used for r in Redemption.query.all())
+    
+    return {
+        'users': {
+            'total': total_users
+        },
+        'disposals': {
+            'total': total_disposals,
+            'total_waste_kg': round(total_waste, 2),
+            'dry_waste_kg': round(dry_waste, 2),
+            'wet_waste_kg': round(wet_waste, 2)
+        },
+        'rewards': {
+            'total_points_distributed': total_points_distributed,
+            'total_points_redeemed': total_points_redeemed,
+            'total_redemptions': total_redemptions
+        }
+    }
+
+def serialize_area(area):
+    return {
+        'id': area.id,
+        'slug': area.slug,
+        'name': area.name,
+        'locality': area.locality,
+        'city': area.city
+    }
+
+def build_area_statistics(area, start_date=None, end_date=None):
+    """Compute waste collection statistics for one area from its daily totals"""
+    totals = area_totals(area.id, start_date, end_date)
+    
+    redemptions = db.session.query(func.count(Redemption.id), func.sum(Redemption.points_used)) \
+        .join(User, Redemption.user_id == User.id).filter(User.area_id == area.id)
+    if start_date:
+        redemptions = redemptions.filter(Redemption.timestamp >= start_date)
+    if end_date:
+        redemptions = redemptions.filter(Redemption.timestamp < end_date)
+    total_redemptions, total_points_redeemed = redemptions.one()
+    
+    return {
+        'area': serialize_area(area),
+        'period': {
+            'start_date': start_date.date().isoformat() if start_date else None,
+            'end_date': (end_date - timedelta(days=1)).date().isoformat() if end_date else None
+        },
+        'users': {
+            'total': User.query.filter_by(area_id=area.id).count()
+        },
+        'disposals': {
+            'total': sum(t['count'] for t in totals.values()),
+            'total_waste_kg': round(sum(t['weight'] for t in totals.values()), 2),
+            'dry_waste_kg': round(totals['dry']['weight'], 2),
+            'wet_waste_kg': round(totals['wet']['weight'], 2)
+        },
+        'rewards': {
+            'total_points_distributed': sum(t['points'] for t in totals.values()),
+            'total_points_redeemed': int(total_points_redeemed or 0),
+            'total_redemptions': total_redemptions
+        },
+        'daily': area_daily(area.id, start_date, end_date)
+    }
+
 @app.route('/api/admin/statistics', methods=['GET'])
 @admin_required
 def get_statistics(current_admin):
-    """Get overall waste collection statistics"""
+    """Get overall waste collection statistics, optionally for one area and date range"""
     try:
-        total_users = User.query.count()
-        total_disposals = Disposal.query.count()
+        area_ref = request.args.get('area')
+        if not area_ref:
+            return jsonify(cache.get_or_compute('reports', 'statistics', build_statistics, REPORT_TTL)), 200
         
-        all_disposals = Disposal.query.all()
-        total_waste = sum(d.weight for d in all_disposals)
-        dry_waste = sum(d.weight for d in all_disposals if d.waste_type == 'dry')
-        wet_waste = sum(d.weight for d in all_disposals if d.waste_type == 'wet')
-        total_points_distributed = sum(d.points_earned for d in all_disposals)
+        area = find_area(area_ref)
+        if not area:
+            return jsonify({'error': 'Area not found'}), 404
         
-        total_redemptions = Redemption.query.count()
-        total_points_redeemed = sum(r.points_used for r in Redemption.query.all())
+        # Area statistics are kept per day, so the date range covers whole days
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.fromisoformat(start_date[:10]) if start_date else None
+        end_date = datetime.fromisoformat(end_date[:10]) + timedelta(days=1) if end_date else None
         
-        return jsonify({
-            'users': {
-                'total': total_users
-            },
-            'disposals': {
-                'total': total_disposals,
-                'total_waste_kg': round(total_waste, 2),
-                'dry_waste_kg': round(dry_waste, 2),
-                'wet_waste_kg': round(wet_waste, 2)
-            },
-            'rewards': {
-                'total_points_distributed': total_points_distributed,
-                'total_points_redeemed': total_points_redeemed,
-                'total_redemptions': total_redemptions
-            }
-        }), 200
+        statistics = cache.get_or_compute(
+            'reports', f'statistics:area:{area.id}:{start_date}:{end_date}',
+            lambda: build_area_statistics(area, start_date, end_date), REPORT_TTL)
+        return jsonify(statistics), 200
     
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
     except Exception as e:
         logger.error(f"Error fetching statistics: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def month_range(year, month):
+    """Start of the month and start of the next month"""
+    start_date = datetime(year, month, 1)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1)
+    else:
+        end_date = datetime(year, month + 1, 1)
+    return start_date, end_date
+
+def build_monthly_report(year, month):
+    """Compute the monthly summary report"""
+    # Calculate date range for the month
+    start_date, end_date = month_range(year, month)
+    
+    # Aggregate disposals for the month across hot and archived data
+    totals = disposal_totals(start_date, end_date)
+    user_waste = {user_id: t['weight'] for user_id, t in user_totals(start_date, end_date).items()}
+    
+    # Calculate statistics
+    total_disposals = sum(t['count'] for t in totals.values())
+    total_waste = sum(t['weight'] for t in totals.values())
+    dry_waste = totals['dry']['weight']
+    wet_waste = totals['wet']['weight']
+    total_points = sum(t['points'] for t in totals.values())
+    
+    # Get unique users who disposed in this month
+    unique_users = len(user_waste)
+    
+    # Get redemptions for the month
+    redemptions = Redemption.query.filter(
+        Redemption.timestamp >= start_date,
+        Redemption.timestamp < end_date
+    ).all()
+    
+    # Top users by waste disposed
+    top = sorted(user_waste.items(), key=lambda x: x[1], reverse=True)[:5]
+    users = {user.id: user for user in User.query.filter(User.id.in_([user_id for user_id, _ in top]))} if top else {}
+    top_users = []
+    for user_id, waste in top:
+        user = users.get(user_id)
+        if user:
+            top_users.append({
+                'name': user.name,
+                'phone': user.phone,
+                'waste_kg': round(waste, 2)
+            })
+    
+    return {
+        'report': {
+            'month': month,
+            'year': year,
+            'period': f"{start_date.strftime('%B %Y')}"
+        },
+        'summary': {
+            'total_disposals': total_disposals,
+            'active_users': unique_users,
+            'total_waste_kg': round(total_waste, 2),
+            'dry_waste_kg': round(dry_waste, 2),
+            'wet_waste_kg': round(wet_waste, 2),
+            'total_points_earned': total_points,
+            'total_redemptions': len(redemptions),
+            'points_redeemed': sum(r.points_used for r in redemptions)
+        },
+        'top_users': top_users
+    }
+
+def build_area_monthly_report(area, year, month):
+    """Compute the monthly summary report for one area from its daily totals"""
+    start_date, end_date = month_range(year, month)
+    statistics = build_area_statistics(area, start_date, end_date)
+    
+    return {
+        'report': {
+            'month': month,
+            'year': year,
+            'period': f"{start_date.strftime('%B %Y')}"
+        },
+        'area': statistics['area'],
+        'summary': {
+            'total_disposals': statistics['disposals']['total'],
+            'total_waste_kg': statistics['disposals']['total_waste_kg'],
+            'dry_waste_kg': statistics['disposals']['dry_waste_kg'],
+            'wet_waste_kg': statistics['disposals']['wet_waste_kg'],
+            'total_points_earned': statistics['rewards']['total_points_distributed'],
+            'total_redemptions': statistics['rewards']['total_redemptions'],
+            'points_redeemed': statistics['rewards']['total_points_redeemed']
+        },
+        'daily': statistics['daily']
+    }
+
 @app.route('/api/admin/reports/monthly', methods=['GET'])
 @admin_required
 def get_monthly_report(current_admin):
@@ -547,72 +1008,80 @@ def get_monthly_report(current_admin):
         if year < 2000 or year > 2100:
             return jsonify({'error': 'Invalid year'}), 400
         
-        # Calculate date range for the month
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        # Query disposals for the month
-        disposals = Disposal.query.filter(
-            Disposal.timestamp >= start_date,
-            Disposal.timestamp < end_date
-        ).all()
-        
-        # Calculate statistics
-        total_waste = sum(d.weight for d in disposals)
-        dry_waste = sum(d.weight for d in disposals if d.waste_type == 'dry')
-        wet_waste = sum(d.weight for d in disposals if d.waste_type == 'wet')
-        total_points = sum(d.points_earned for d in disposals)
-        
-        # Get unique users who disposed in this month
-        unique_users = len(set(d.user_id for d in disposals))
-        
-        # Get redemptions for the month
-        redemptions = Redemption.query.filter(
-            Redemption.timestamp >= start_date,
-            Redemption.timestamp < end_date
-        ).all()
-        
-        # Top users by waste disposed
-        user_waste = {}
-        for disposal in disposals:
-            if disposal.user_id not in user_waste:
-                user_waste[disposal.user_id] = 0
-            user_waste[disposal.user_id] += disposal.weight
-        
-        top_users = []
-        for user_id, waste in sorted(user_waste.items(), key=lambda x: x[1], reverse=True)[:5]:
-            user = User.query.get(user_id)
-            if user:
-                top_users.append({
-                    'name': user.name,
-                    'phone': user.phone,
-                    'waste_kg': round(waste, 2)
-                })
+        area_ref = request.args.get('area')
+        if area_ref:
+            area = find_area(area_ref)
+            if not area:
+                return jsonify({'error': 'Area not found'}), 404
+            report = cache.get_or_compute('reports', f'monthly:{year}-{month:02d}:area:{area.id}',
+                                          lambda: build_area_monthly_report(area, year, month), REPORT_TTL)
+            return jsonify(report), 200
+        
+        report = cache.get_or_compute('reports', f'monthly:{year}-{month:02d}',
+                                      lambda: build_monthly_report(year, month), REPORT_TTL)
+        return jsonify(report), 200
+    
+    except Exception as e:
+        logger.error(f"Error generating monthly report: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/areas', methods=['GET'])
+@admin_required
+def get_areas(current_admin):
+    """Get all areas with their user counts"""
+    try:
+        city = request.args.get('city')
+        
+        query = db.session.query(Area, func.count(User.id)).outerjoin(User, User.area_id == Area.id)
+        if city:
+            query = query.filter(Area.city == city)
+        rows = query.group_by(Area.id).order_by(Area.city, Area.name).all()
+        
+        area_list = [dict(serialize_area(area), users=users) for area, users in rows]
         
+        return jsonify({'areas': area_list, 'total': len(area_list)}), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching areas: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/rate-limits', methods=['GET'])
+@admin_required
+def get_rate_limits(current_admin):
+    """Get rate limit settings and this worker's rejection counters"""
+    try:
         return jsonify({
-            'report': {
-                'month': month,
-                'year': year,
-                'period': f"{start_date.strftime('%B %Y')}"
-            },
-            'summary': {
-                'total_disposals': len(disposals),
-                'active_users': unique_users,
-                'total_waste_kg': round(total_waste, 2),
-                'dry_waste_kg': round(dry_waste, 2),
-                'wet_waste_kg': round(wet_waste, 2),
-                'total_points_earned': total_points,
-                'total_redemptions': len(redemptions),
-                'points_redeemed': sum(r.points_used for r in redemptions)
-            },
-            'top_users': top_users
+            'enabled': RATE_LIMIT_CONFIG['enabled'],
+            'limits': RATE_LIMIT_CONFIG['limits'],
+            'metrics': rate_limit_metrics.snapshot()
         }), 200
     
     except Exception as e:
-        logger.error(f"Error generating monthly report: {str(e)}")
+        logger.error(f"Error fetching rate limit metrics: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/stream', methods=['GET'])
+@admin_required(allow_query_token=True)
+def stream_events(current_admin):
+    """Server-sent events feed of new disposals, redemptions and counter deltas"""
+    try:
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        subscriber = live_feed.subscribe(int(last_event_id) if last_event_id else None)
+        
+        # Streams never touch the DB again, so release the connection for the duration
+        db.session.close()
+        
+        logger.info(f"Live feed opened by {current_admin.username}")
+        
+        return Response(live_feed.stream(subscriber), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid last_event_id value'}), 400
+    except Exception as e:
+        logger.error(f"Error opening live feed: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/admin/rewards', methods=['POST'])
@@ -637,6 +1106,7 @@ def create_reward(current_admin):
         
         db.session.add(reward)
         db.session.commit()
+        cache.invalidate('rewards')
         
         logger.info(f"New reward created by {current_admin.username}: {reward.name}")
         
@@ -656,6 +1126,369 @@ def create_reward(current_admin):
         logger.error(f"Error creating reward: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/admin/rewards/<int:reward_id>/vouchers', methods=['POST'])
+@admin_required
+def add_reward_vouchers(current_admin, reward_id):
+    """Import or generate voucher codes for a reward"""
+    try:
+        reward = Reward.query.get(reward_id)
+        
+        if not reward:
+            return jsonify({'error': 'Reward not found'}), 404
+        
+        data = request.get_json()
+        
+        if data.get('codes'):
+            if not isinstance(data['codes'], list):
+                return jsonify({'error': 'codes must be a list'}), 400
+            codes = [str(c) for c in data['codes']]
+            if any(len(c.strip()) > 64 for c in codes):
+                return jsonify({'error': 'Voucher codes must be at most 64 characters'}), 400
+        elif data.get('generate'):
+            count = int(data['generate'])
+            prefix = str(data.get('prefix', ''))
+            if count <= 0 or count > 100000:
+                return jsonify({'error': 'generate must be between 1 and 100000'}), 400
+            if len(prefix) > 32:
+                return jsonify({'error': 'prefix must be at most 32 characters'}), 400
+            codes = generate_codes(count, prefix)
+        else:
+            return jsonify({'error': 'codes or generate is required'}), 400
+        
+        if 'low_stock_threshold' in data:
+            threshold = data['low_stock_threshold']
+            reward.low_stock_threshold = int(threshold) if threshold is not None else None
+        
+        added, skipped = import_codes(reward, codes)
+        db.session.commit()
+        
+        logger.info(f"{added} voucher codes added to reward {reward.name} by {current_admin.username}")
+        
+        return jsonify({
+            'message': 'Voucher codes added successfully',
+            'added': added,
+            'skipped': skipped,
+            'stock': stock_report(reward)
+        }), 201
+    
+    except ValueError:
+        db.session.rollback()
+        return jsonify({'error': 'Invalid voucher parameters'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error adding voucher codes: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/rewards/<int:reward_id>/vouchers', methods=['GET'])
+@admin_required
+def get_reward_vouchers(current_admin, reward_id):
+    """Get voucher pool depth for a reward"""
+    try:
+        reward = Reward.query.get(reward_id)
+        
+        if not reward:
+            return jsonify({'error': 'Reward not found'}), 404
+        
+        return jsonify({'stock': stock_report(reward)}), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching voucher stock: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/vouchers/stock', methods=['GET'])
+@admin_required
+def get_voucher_stock(current_admin):
+    """Get voucher pool depth for all voucher-backed rewards, emptiest first"""
+    try:
+        reports = stock_reports()
+        
+        return jsonify({
+            'pools': reports,
+            'low_stock': [r['reward_id'] for r in reports if r['low_stock']]
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching voucher stock: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def serialize_rule(rule):
+    return {
+        'id': rule.id,
+        'name': rule.name,
+        'kind': rule.kind,
+        'waste_type': rule.waste_type,
+        'params': json.loads(rule.params),
+        'starts_at': rule.starts_at.isoformat() if rule.starts_at else None,
+        'ends_at': rule.ends_at.isoformat() if rule.ends_at else None,
+        'active': rule.active
+    }
+
+@app.route('/api/admin/reward-rules', methods=['GET'])
+@admin_required
+def get_reward_rules(current_admin):
+    """Get all reward rules"""
+    try:
+        rules = RewardRule.query.order_by(RewardRule.id).all()
+        return jsonify({'rules': [serialize_rule(r) for r in rules], 'total': len(rules)}), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching reward rules: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/reward-rules', methods=['POST'])
+@admin_required
+def create_reward_rule(current_admin):
+    """Create a reward rule and publish a new rule version"""
+    try:
+        data = request.get_json()
+        
+        # Validate required fields
+        required_fields = ['name', 'kind', 'params']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        waste_type = data['waste_type'].lower() if data.get('waste_type') else None
+        starts_at = datetime.fromisoformat(data['starts_at']) if data.get('starts_at') else None
+        ends_at = datetime.fromisoformat(data['ends_at']) if data.get('ends_at') else None
+        error = validate_rule(data['kind'], waste_type, data['params'], starts_at, ends_at)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        rule = RewardRule(
+            name=data['name'],
+            kind=data['kind'],
+            waste_type=waste_type,
+            params=json.dumps(data['params']),
+            starts_at=starts_at,
+            ends_at=ends_at,
+            active=data.get('active', True)
+        )
+        
+        db.session.add(rule)
+        bump_version()
+        db.session.commit()
+        reward_engine.invalidate()
+        
+        logger.info(f"New reward rule created by {current_admin.username}: {rule.name}")
+        
+        return jsonify({'message': 'Reward rule created successfully', 'rule': serialize_rule(rule)}), 201
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid starts_at or ends_at value'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating reward rule: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/reward-rules/<int:rule_id>', methods=['PUT'])
+@admin_required
+def update_reward_rule(current_admin, rule_id):
+    """Update a reward rule and publish a new rule version"""
+    try:
+        rule = RewardRule.query.get(rule_id)
+        
+        if not rule:
+            return jsonify({'error': 'Reward rule not found'}), 404
+        
+        data = request.get_json()
+        
+        waste_type = data['waste_type'].lower() if data.get('waste_type') else None
+        if 'waste_type' not in data:
+            waste_type = rule.waste_type
+        params = data.get('params', json.loads(rule.params))
+        starts_at = rule.starts_at
+        if 'starts_at' in data:
+            starts_at = datetime.fromisoformat(data['starts_at']) if data['starts_at'] else None
+        ends_at = rule.ends_at
+        if 'ends_at' in data:
+            ends_at = datetime.fromisoformat(data['ends_at']) if data['ends_at'] else None
+        error = validate_rule(rule.kind, waste_type, params, starts_at, ends_at)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        rule.name = data.get('name', rule.name)
+        rule.waste_type = waste_type
+        rule.params = json.dumps(params)
+        rule.starts_at = starts_at
+        rule.ends_at = ends_at
+        rule.active = data.get('active', rule.active)
+        
+        bump_version()
+        db.session.commit()
+        reward_engine.invalidate()
+        
+        logger.info(f"Reward rule updated by {current_admin.username}: {rule.name}")
+        
+        return jsonify({'message': 'Reward rule updated successfully', 'rule': serialize_rule(rule)}), 200
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid starts_at or ends_at value'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating reward rule: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/bins', methods=['POST'])
+@admin_required
+def register_bin(current_admin):
+    """Register a new bin and issue its device key"""
+    try:
+        data = request.get_json()
+        
+        # Validate required fields
+        required_fields = ['name', 'waste_type', 'location', 'capacity_kg']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        waste_type = data['waste_type'].lower()
+        capacity_kg = float(data['capacity_kg'])
+        
+        if waste_type not in ['dry', 'wet']:
+            return jsonify({'error': 'waste_type must be either "dry" or "wet"'}), 400
+        
+        if capacity_kg <= 0:
+            return jsonify({'error': 'capacity_kg must be greater than 0'}), 400
+        
+        bin_ = Bin(
+            name=data['name'],
+            waste_type=waste_type,
+            location=data['location'],
+            capacity_kg=capacity_kg
+        )
+        
+        db.session.add(bin_)
+        db.session.commit()
+        
+        logger.info(f"New bin registered by {current_admin.username}: {bin_.name} (ID: {bin_.id})")
+        
+        return jsonify({
+            'message': 'Bin registered successfully',
+            'bin': {
+                'id': bin_.id,
+                'name': bin_.name,
+                'waste_type': bin_.waste_type,
+                'location': bin_.location,
+                'capacity_kg': bin_.capacity_kg,
+                'device_key': bin_.device_key
+            }
+        }), 201
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid capacity_kg value'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error registering bin: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/bins/<int:bin_id>', methods=['PUT'])
+@admin_required
+def update_bin(current_admin, bin_id):
+    """Update a bin's details or deactivate it"""
+    try:
+        bin_ = Bin.query.get(bin_id)
+        
+        if not bin_:
+            return jsonify({'error': 'Bin not found'}), 404
+        
+        data = request.get_json()
+        
+        if 'capacity_kg' in data:
+            capacity_kg = float(data['capacity_kg'])
+            if capacity_kg <= 0:
+                return jsonify({'error': 'capacity_kg must be greater than 0'}), 400
+            bin_.capacity_kg = capacity_kg
+        
+        if 'active' in data:
+            if not isinstance(data['active'], bool):
+                return jsonify({'error': 'active must be true or false'}), 400
+            bin_.active = data['active']
+        
+        bin_.name = data.get('name', bin_.name)
+        bin_.location = data.get('location', bin_.location)
+        
+        db.session.commit()
+        # Other workers stop accepting the old key once their cached copy expires
+        telemetry_store.forget(bin_.id)
+        
+        logger.info(f"Bin updated by {current_admin.username}: {bin_.name} (ID: {bin_.id}, active: {bin_.active})")
+        
+        return jsonify({'message': 'Bin updated successfully', 'bin': telemetry_store.fill_state(bin_)}), 200
+    
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid capacity_kg value'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating bin: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/bins', methods=['GET'])
+@admin_required
+def get_bins(current_admin):
+    """Get all bins with their current fill state"""
+    try:
+        bins = Bin.query.filter_by(active=True).all()
+        bin_list = [telemetry_store.fill_state(b) for b in bins]
+        
+        return jsonify({'bins': bin_list, 'total': len(bin_list)}), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching bins: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/bins/<int:bin_id>', methods=['GET'])
+@admin_required
+def get_bin(current_admin, bin_id):
+    """Get a bin's fill state, recent samples and downsampled history"""
+    try:
+        bin_ = Bin.query.get(bin_id)
+        
+        if not bin_:
+            return jsonify({'error': 'Bin not found'}), 404
+        
+        hours = request.args.get('hours', type=int, default=24)
+        history = BinTelemetry.query.filter(
+            BinTelemetry.bin_id == bin_.id,
+            BinTelemetry.bucket_start >= datetime.utcnow() - timedelta(hours=hours)
+        ).order_by(BinTelemetry.bucket_start).all()
+        
+        return jsonify({
+            'bin': telemetry_store.fill_state(bin_),
+            'recent_samples': telemetry_store.recent(bin_.id, request.args.get('samples', type=int, default=60)),
+            'history': [{
+                'bucket_start': h.bucket_start.isoformat(),
+                'sample_count': h.sample_count,
+                'fill_min': h.fill_min,
+                'fill_max': h.fill_max,
+                'fill_avg': round(h.fill_avg, 2),
+                'weight_avg': round(h.weight_avg, 3)
+            } for h in history]
+        }), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching bin: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/admin/bins/collection', methods=['GET'])
+@admin_required
+def get_bins_needing_collection(current_admin):
+    """Get bins whose fill level is at or above the collection threshold"""
+    try:
+        threshold = request.args.get('threshold', type=float,
+                                     default=telemetry_store.config['collection_threshold'])
+        
+        bins = Bin.query.filter_by(active=True).all()
+        states = [telemetry_store.fill_state(b) for b in bins]
+        due = sorted((s for s in states if s['fill_level'] >= threshold),
+                     key=lambda s: s['fill_level'], reverse=True)
+        
+        return jsonify({'threshold': threshold, 'bins': due, 'total': len(due)}), 200
+    
+    except Exception as e:
+        logger.error(f"Error fetching bins needing collection: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 # Initialize database on startup
 with app.app_context():
     init_db()
@@ -0,0 +1,344 @@
+import atexit
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import bindparam, case, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Bin, BinTelemetry
+
+logger = logging.getLogger(__name__)
+
+# Telemetry configuration
+TELEMETRY_CONFIG = {
+    'buffer_size': 720,            # samples kept in memory per bin (~1 hour at 5s intervals)
+    'bucket_seconds': 60,          # width of each downsampled aggregate row
+    'flush_interval': 60,          # seconds between flushes to the database
+    'collection_threshold': 80.0,  # fill level (percent) at which a bin needs collection
+    'device_key_ttl': 60,          # seconds a cached device key is trusted before the bin is re-read
+    'max_batch_samples': 120,      # samples accepted in one request (~10 minutes at 5s intervals)
+    'max_sample_age': 3600,        # seconds a device timestamp may lag behind the server clock
+    'max_clock_skew': 60,          # seconds a device timestamp may run ahead of the server clock
+}
+
+def parse_timestamp(value):
+    """Epoch seconds of an ISO 8601 sample timestamp; naive timestamps are UTC"""
+    if not isinstance(value, str):
+        raise ValueError('timestamp must be an ISO 8601 string')
+    when = datetime.fromisoformat(value)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+class RingBuffer:
+    """Fixed-size, array-backed buffer of (timestamp, fill level, weight) samples"""
+
+    def __init__(self, size):
+        self.size = size
+        self.timestamps = np.zeros(size, dtype=np.float64)
+        self.fill = np.zeros(size, dtype=np.float32)
+        self.weight = np.zeros(size, dtype=np.float32)
+        self.head = 0      # next slot to write
+        self.count = 0     # total samples ever appended
+        self.flushed = 0   # value of count up to which samples were flushed
+
+    def append(self, timestamp, fill, weight):
+        i = self.head
+        self.timestamps[i] = timestamp
+        self.fill[i] = fill
+        self.weight[i] = weight
+        self.head = (i + 1) % self.size
+        self.count += 1
+
+    def latest(self):
+        if self.count == 0:
+            return None
+        i = (self.head - 1) % self.size
+        return float(self.timestamps[i]), float(self.fill[i]), float(self.weight[i])
+
+    def since(self, start):
+        """Return samples numbered [start, count) that are still buffered, oldest first"""
+        start = max(start, self.count - self.size)
+        n = self.count - start
+        if n <= 0:
+            empty = np.zeros(0)
+            return start, empty, empty, empty
+        idx = (self.head - n + np.arange(n)) % self.size
+        return start, self.timestamps[idx], self.fill[idx], self.weight[idx]
+
+def downsample(timestamps, fill, weight, bucket_seconds):
+    """Aggregate samples into fixed-width time buckets using grouped reductions"""
+    buckets = (timestamps // bucket_seconds).astype(np.int64)
+    keys, starts, counts = np.unique(buckets, return_index=True, return_counts=True)
+    return {
+        'bucket_start': keys * bucket_seconds,
+        'sample_count': counts,
+        'fill_min': np.minimum.reduceat(fill, starts),
+        'fill_max': np.maximum.reduceat(fill, starts),
+        'fill_avg': np.add.reduceat(fill.astype(np.float64), starts) / counts,
+        'weight_min': np.minimum.reduceat(weight, starts),
+        'weight_max': np.maximum.reduceat(weight, starts),
+        'weight_avg': np.add.reduceat(weight.astype(np.float64), starts) / counts,
+    }
+
+def _lower(column, value):
+    return case((column > value, value), else_=column)
+
+def _higher(column, value):
+    return case((column < value, value), else_=column)
+
+def _merged_avg(column, value):
+    return (column * BinTelemetry.sample_count + value * bindparam('b_count')) / (BinTelemetry.sample_count + bindparam('b_count'))
+
+# Merges a flushed bucket into the row another worker already wrote for it. The
+# averages are assigned first because MySQL evaluates SET clauses left to right
+# and they must be weighted by the old sample_count.
+MERGE_BUCKET = (
+    update(BinTelemetry)
+    .where(BinTelemetry.bin_id == bindparam('b_bin_id'), BinTelemetry.bucket_start == bindparam('b_bucket_start'))
+    .ordered_values(
+        (BinTelemetry.fill_avg, _merged_avg(BinTelemetry.fill_avg, bindparam('b_fill_avg'))),
+        (BinTelemetry.weight_avg, _merged_avg(BinTelemetry.weight_avg, bindparam('b_weight_avg'))),
+        (BinTelemetry.fill_min, _lower(BinTelemetry.fill_min, bindparam('b_fill_min'))),
+        (BinTelemetry.fill_max, _higher(BinTelemetry.fill_max, bindparam('b_fill_max'))),
+        (BinTelemetry.weight_min, _lower(BinTelemetry.weight_min, bindparam('b_weight_min'))),
+        (BinTelemetry.weight_max, _higher(BinTelemetry.weight_max, bindparam('b_weight_max'))),
+        (BinTelemetry.sample_count, BinTelemetry.sample_count + bindparam('b_count')),
+    )
+    .execution_options(synchronize_session=False)
+)
+
+def save_bucket(bin_id, bucket):
+    """Insert one bucket's aggregates, or merge them into the row already stored for that bin and minute"""
+    params = {f'b_{name}': value for name, value in bucket.items()}
+    params['b_bin_id'] = bin_id
+    if db.session.execute(MERGE_BUCKET, params).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(BinTelemetry).values(bin_id=bin_id, sample_count=bucket['count'], **{
+                name: value for name, value in bucket.items() if name != 'count'}))
+    except IntegrityError:
+        # Inserted by another worker's flush since the update above
+        db.session.execute(MERGE_BUCKET, params)
+
+def save_latest(bin_id, timestamp, fill, weight):
+    """Store a bin's latest reading unless another worker has already stored a newer one"""
+    last_seen = datetime.utcfromtimestamp(timestamp)
+    db.session.execute(
+        update(Bin)
+        .where(Bin.id == bin_id, or_(Bin.last_seen.is_(None), Bin.last_seen < last_seen))
+        .values(last_seen=last_seen, fill_level=fill, current_weight=weight)
+        .execution_options(synchronize_session=False)
+    )
+
+class TelemetryStore:
+    """Per-bin ring buffers with periodic flushes of downsampled aggregates
+
+    Once bound to an app, a background thread flushes every flush_interval
+    seconds, so a worker that stops receiving telemetry still writes its
+    completed buckets, and the open buckets are written at exit.
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(TELEMETRY_CONFIG, **(config or {}))
+        self.buffers = {}
+        self.device_keys = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.last_flush = time.time()
+        self.app = None
+        self.thread = None
+
+    def init_app(self, app):
+        """Set the app whose context background and exit flushes run in"""
+        self.app = app
+        atexit.register(self.flush_at_exit)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None and self.app is not None:
+                self.thread = threading.Thread(target=self._run, name='telemetry-flush', daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.config['flush_interval'])
+            with self.app.app_context():
+                try:
+                    self.maybe_flush()
+                finally:
+                    db.session.remove()
+
+    def flush_at_exit(self):
+        """Write every buffered sample, including the still-open buckets"""
+        if self.app is None:
+            return
+        with self.flush_lock, self.app.app_context():
+            try:
+                self.flush(now=time.time() + self.config['bucket_seconds'])
+            except Exception:
+                pass  # already logged by flush
+            finally:
+                db.session.remove()
+
+    def check_device_key(self, bin_id, device_key):
+        """Validate a device key, caching active bins' keys for device_key_ttl seconds
+
+        The expiry bounds how long other workers accept a bin deactivated
+        elsewhere; the worker that deactivates it forgets the key at once.
+        """
+        now = time.monotonic()
+        cached = self.device_keys.get(bin_id)
+        if cached is None or cached[1] <= now:
+            bin_ = Bin.query.get(bin_id)
+            if not bin_ or not bin_.active:
+                self.forget(bin_id)
+                return False
+            cached = (bin_.device_key, now + self.config['device_key_ttl'])
+            self.device_keys[bin_id] = cached
+        return device_key == cached[0]
+
+    def forget(self, bin_id):
+        self.device_keys.pop(bin_id, None)
+
+    def ingest(self, bin_id, fill, weight, timestamp=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        return self.ingest_batch(bin_id, [(timestamp, fill, weight)])
+
+    def ingest_batch(self, bin_id, samples):
+        """Buffer (timestamp, fill, weight) samples given in time order; returns how many were kept
+
+        Samples older than the bin's newest buffered one are dropped, which keeps
+        each buffer in time order and makes a device's retried batch harmless.
+        """
+        if self.thread is None:
+            self.start()
+        kept = 0
+        with self.lock:
+            buffer = self.buffers.get(bin_id)
+            if buffer is None:
+                buffer = RingBuffer(self.config['buffer_size'])
+                self.buffers[bin_id] = buffer
+            for timestamp, fill, weight in samples:
+                latest = buffer.latest()
+                if latest and timestamp < latest[0]:
+                    continue
+                buffer.append(timestamp, fill, weight)
+                kept += 1
+        return kept
+
+    def latest(self, bin_id):
+        with self.lock:
+            buffer = self.buffers.get(bin_id)
+            return buffer.latest() if buffer else None
+
+    def recent(self, bin_id, limit):
+        """Return up to `limit` of the newest buffered samples, oldest first"""
+        with self.lock:
+            buffer = self.buffers.get(bin_id)
+            if buffer is None:
+                return []
+            _, ts, fill, weight = buffer.since(buffer.count - limit)
+            return [
+                {
+                    'timestamp': datetime.utcfromtimestamp(t).isoformat(),
+                    'fill_level': round(float(f), 2),
+                    'weight': round(float(w), 3)
+                }
+                for t, f, w in zip(ts, fill, weight)
+            ]
+
+    def maybe_flush(self):
+        """Flush if the flush interval has elapsed and no other flush is running
+
+        Errors are logged by flush and not raised; unflushed samples stay
+        buffered and are retried after the next interval.
+        """
+        if time.time() - self.last_flush < self.config['flush_interval']:
+            return 0
+        if not self.flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self.flush()
+        except Exception:
+            self.last_flush = time.time()
+            return 0
+        finally:
+            self.flush_lock.release()
+
+    def flush(self, now=None):
+        """Write aggregates for every completed bucket and the latest state of each bin"""
+        now = now if now is not None else time.time()
+        bucket_seconds = self.config['bucket_seconds']
+        open_bucket = (now // bucket_seconds) * bucket_seconds
+
+        pending = []
+        with self.lock:
+            for bin_id, buffer in self.buffers.items():
+                start, ts, fill, weight = buffer.since(buffer.flushed)
+                complete = int(np.searchsorted(ts, open_bucket, side='left'))
+                latest = buffer.latest() if buffer.count > buffer.flushed else None
+                if complete or latest:
+                    pending.append((bin_id, buffer, start + complete,
+                                    ts[:complete], fill[:complete], weight[:complete], latest))
+
+        rows = 0
+        try:
+            for bin_id, _, _, ts, fill, weight, latest in pending:
+                if len(ts):
+                    agg = downsample(ts, fill, weight, bucket_seconds)
+                    for i in range(len(agg['bucket_start'])):
+                        save_bucket(bin_id, {
+                            'bucket_start': datetime.utcfromtimestamp(float(agg['bucket_start'][i])),
+                            'count': int(agg['sample_count'][i]),
+                            'fill_min': float(agg['fill_min'][i]),
+                            'fill_max': float(agg['fill_max'][i]),
+                            'fill_avg': float(agg['fill_avg'][i]),
+                            'weight_min': float(agg['weight_min'][i]),
+                            'weight_max': float(agg['weight_max'][i]),
+                            'weight_avg': float(agg['weight_avg'][i])
+                        })
+                        rows += 1
+                if latest:
+                    save_latest(bin_id, *latest)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error flushing bin telemetry: {str(e)}")
+            raise
+
+        with self.lock:
+            for _, buffer, flushed, _, _, _, _ in pending:
+                buffer.flushed = max(buffer.flushed, flushed)
+        self.last_flush = now
+
+        if rows:
+            logger.info(f"Flushed {rows} telemetry aggregates for {len(pending)} bins")
+        return rows
+
+    def fill_state(self, bin_):
+        """Current fill state of a bin from this worker's buffer or the database, whichever is newer"""
+        last_seen, fill_level, weight = bin_.last_seen, bin_.fill_level or 0.0, bin_.current_weight or 0.0
+        latest = self.latest(bin_.id)
+        if latest:
+            buffered_at = datetime.utcfromtimestamp(latest[0])
+            if last_seen is None or buffered_at > last_seen:
+                last_seen, fill_level, weight = buffered_at, latest[1], latest[2]
+        return {
+            'id': bin_.id,
+            'name': bin_.name,
+            'waste_type': bin_.waste_type,
+            'location': bin_.location,
+            'capacity_kg': bin_.capacity_kg,
+            'fill_level': round(fill_level, 2),
+            'current_weight': round(weight, 3),
+            'last_seen': last_seen.isoformat() if last_seen else None,
+            'active': bin_.active
+        }
+
+telemetry_store = TelemetryStore()
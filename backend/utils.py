@@ -5,12 +5,25 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Reward points configuration
+# Default base rates, seeded into the reward_rules table on first start
 REWARD_CONFIG = {
     'dry': 15,  # 15 points per kg for dry waste
     'wet': 10   # 10 points per kg for wet waste
 }
 
+def make_qr_image(qr_data, box_size=10):
+    """Render a user's QR code as a PIL image"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=4,
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    
+    return qr.make_image(fill_color="black", back_color="white")
+
 def generate_qr_code(qr_data, user_id):
     """Generate QR code for user authentication"""
     try:
@@ -19,16 +32,7 @@ def generate_qr_code(qr_data, user_id):
         qr_dir.mkdir(exist_ok=True)
         
         # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
+        img = make_qr_image(qr_data)
         
         # Save QR code
         qr_filename = f'user_{user_id}_{qr_data}.png'
@@ -42,7 +46,8 @@ def generate_qr_code(qr_data, user_id):
         logger.error(f"Error generating QR code: {str(e)}")
         return None
 
-def calculate_reward_points(waste_type, weight):
-    """Calculate reward points based on waste type and weight"""
-    points_per_kg = REWARD_CONFIG.get(waste_type.lower(), 0)
-    return int(weight * points_per_kg)
+def calculate_reward_points(waste_type, weight, timestamp=None, bin_id=None, streak_days=0):
+    """Calculate reward points using the active reward rules"""
+    # Import here to avoid circular import
+    from rules import reward_engine
+    return reward_engine.points(waste_type.lower(), weight, timestamp, bin_id, streak_days)
@@ -0,0 +1,201 @@
+import secrets
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+
+from database import db
+from models import User, Reward, Redemption, VoucherCode
+from event_log import redemption_event
+
+logger = logging.getLogger(__name__)
+
+# Voucher pool configuration
+VOUCHER_CONFIG = {
+    'low_stock_threshold': 20,  # available codes at or below which a pool is low on stock
+    'import_batch_size': 1000,  # codes inserted per statement
+    'code_length': 12,          # characters in generated codes, excluding the prefix
+}
+
+# Unambiguous characters for generated codes (no 0/O or 1/I)
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+
+# Reward.stock_alert_level values
+STOCK_OK = 0
+STOCK_LOW = 1
+STOCK_EMPTY = 2
+
+# redeem() outcomes
+REDEEMED = 'redeemed'
+INSUFFICIENT_POINTS = 'insufficient_points'
+OUT_OF_STOCK = 'out_of_stock'
+
+def generate_codes(count, prefix=''):
+    """Random voucher codes, grouped in fours for readability"""
+    codes = set()
+    while len(codes) < count:
+        raw = ''.join(secrets.choice(CODE_ALPHABET) for _ in range(VOUCHER_CONFIG['code_length']))
+        grouped = '-'.join(raw[i:i + 4] for i in range(0, len(raw), 4))
+        codes.add(f'{prefix}-{grouped}' if prefix else grouped)
+    return list(codes)
+
+def import_codes(reward, codes):
+    """Add codes to a reward's pool in batches, skipping ones that already exist; returns (added, skipped)"""
+    codes = list(dict.fromkeys(c.strip() for c in codes if c and c.strip()))
+    batch_size = VOUCHER_CONFIG['import_batch_size']
+    added = 0
+    for i in range(0, len(codes), batch_size):
+        batch = codes[i:i + batch_size]
+        existing = {c for (c,) in db.session.query(VoucherCode.code).filter(VoucherCode.code.in_(batch))}
+        rows = [{'reward_id': reward.id, 'code': c, 'status': 'available', 'created_at': datetime.utcnow()}
+                for c in batch if c not in existing]
+        if rows:
+            db.session.execute(VoucherCode.__table__.insert(), rows)
+            added += len(rows)
+    reward.uses_vouchers = True
+    # A restocked pool alerts again the next time it runs low
+    reward.stock_alert_level = min(reward.stock_alert_level or STOCK_OK,
+                                   _stock_level(available_codes(reward.id), low_stock_threshold(reward)))
+    return added, len(codes) - added
+
+def claim_voucher(reward_id, redemption_id):
+    """Claim one available code for a redemption in the current transaction; returns the code or None
+
+    Claims never wait on each other: MySQL and PostgreSQL skip rows locked by
+    concurrent claims, and SQLite claims with a single atomic UPDATE.
+    """
+    now = datetime.utcnow()
+    if db.engine.dialect.name == 'sqlite':
+        pick = (select(VoucherCode.id)
+                .where(VoucherCode.reward_id == reward_id, VoucherCode.status == 'available')
+                .limit(1)
+                .scalar_subquery())
+        row = db.session.execute(
+            update(VoucherCode)
+            .where(VoucherCode.id == pick, VoucherCode.status == 'available')
+            .values(status='claimed', redemption_id=redemption_id, claimed_at=now)
+            .returning(VoucherCode.code)
+            .execution_options(synchronize_session=False)
+        ).first()
+        return row[0] if row else None
+
+    row = db.session.execute(
+        select(VoucherCode.id, VoucherCode.code)
+        .where(VoucherCode.reward_id == reward_id, VoucherCode.status == 'available')
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if row is None:
+        return None
+    db.session.execute(
+        update(VoucherCode)
+        .where(VoucherCode.id == row.id)
+        .values(status='claimed', redemption_id=redemption_id, claimed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return row.code
+
+def redeem(user_id, reward):
+    """Deduct points, record the redemption and claim a voucher code in one transaction
+
+    Returns (outcome, redemption, code). The redemption's outbox event is added
+    in the same transaction, which is committed only when the outcome is
+    REDEEMED; otherwise it is rolled back and nothing changes.
+    """
+    # Deduct points only if the current balance still covers the reward
+    deducted = User.query.filter(
+        User.id == user_id,
+        User.reward_points >= reward.points_required
+    ).update({User.reward_points: User.reward_points - reward.points_required}, synchronize_session=False)
+    if not deducted:
+        db.session.rollback()
+        return INSUFFICIENT_POINTS, None, None
+
+    redemption = Redemption(user_id=user_id, reward_id=reward.id, points_used=reward.points_required)
+    db.session.add(redemption)
+    db.session.flush()
+
+    # An empty pool undoes the deduction
+    code = None
+    if reward.uses_vouchers:
+        code = claim_voucher(reward.id, redemption.id)
+        if code is None:
+            db.session.rollback()
+            return OUT_OF_STOCK, None, None
+
+    db.session.add(redemption_event(redemption))
+    db.session.commit()
+    return REDEEMED, redemption, code
+
+def pool_depths(reward_ids=None):
+    """Available and claimed code counts per reward"""
+    query = db.session.query(VoucherCode.reward_id, VoucherCode.status, func.count(VoucherCode.id))
+    if reward_ids is not None:
+        query = query.filter(VoucherCode.reward_id.in_(reward_ids))
+    depths = {}
+    for reward_id, status, count in query.group_by(VoucherCode.reward_id, VoucherCode.status):
+        depths.setdefault(reward_id, {'available': 0, 'claimed': 0})[status] = count
+    return depths
+
+def available_codes(reward_id):
+    """Number of unclaimed codes in one reward's pool"""
+    return db.session.query(func.count(VoucherCode.id)).filter_by(reward_id=reward_id, status='available').scalar()
+
+def low_stock_threshold(reward):
+    threshold = reward.low_stock_threshold
+    return VOUCHER_CONFIG['low_stock_threshold'] if threshold is None else threshold
+
+def _stock_level(available, threshold):
+    if available == 0:
+        return STOCK_EMPTY
+    return STOCK_LOW if available <= threshold else STOCK_OK
+
+def _report(reward, depth):
+    threshold = low_stock_threshold(reward)
+    return {
+        'reward_id': reward.id,
+        'reward_name': reward.name,
+        'available': depth['available'],
+        'claimed': depth['claimed'],
+        'low_stock_threshold': threshold,
+        'low_stock': depth['available'] <= threshold
+    }
+
+def stock_report(reward):
+    """Pool depth and low-stock status for one reward"""
+    return _report(reward, pool_depths([reward.id]).get(reward.id, {'available': 0, 'claimed': 0}))
+
+def check_low_stock(reward):
+    """Log an alert the first time a pool is at or below its threshold, and again when it is empty
+
+    The alert level is raised with a conditional update, so of several workers
+    seeing the same pool state only one logs it. Commits the new level.
+    """
+    available = available_codes(reward.id)
+    level = _stock_level(available, low_stock_threshold(reward))
+    if level == STOCK_OK:
+        return available
+    try:
+        raised = db.session.execute(
+            update(Reward)
+            .where(Reward.id == reward.id, Reward.stock_alert_level < level)
+            .values(stock_alert_level=level)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording voucher stock alert: {str(e)}")
+        return available
+    if raised and level == STOCK_EMPTY:
+        logger.warning(f"Voucher pool empty for reward {reward.name} (ID: {reward.id})")
+    elif raised:
+        logger.warning(f"Voucher pool low for reward {reward.name} (ID: {reward.id}): {available} codes left")
+    return available
+
+def stock_reports():
+    """Stock reports for every voucher-backed reward, emptiest pools first"""
+    rewards = Reward.query.filter_by(uses_vouchers=True).all()
+    depths = pool_depths([r.id for r in rewards])
+    reports = [_report(r, depths.get(r.id, {'available': 0, 'claimed': 0})) for r in rewards]
+    return sorted(reports, key=lambda r: r['available'])
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# The server reads its configuration at import time, so point it at throwaway storage first
+TEST_DIR = tempfile.mkdtemp(prefix='waste_disposal_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ['EVENT_LOG_DIR'] = os.path.join(TEST_DIR, 'event_log')
+os.environ['IMPORT_DIR'] = os.path.join(TEST_DIR, 'imports')
+os.environ['CACHE_BACKEND'] = 'memory'
+os.environ['RATE_LIMITS_ENABLED'] = '0'  # enabled per test in test_ratelimit.py
+
+@pytest.fixture(scope='session')
+def app():
+    import server
+    server.app.config['TESTING'] = True
+    return server.app
+
+@pytest.fixture
+def database(app):
+    """Fresh tables and seed data for each test, with per-worker state reset"""
+    from database import db, init_db
+    from cache import cache
+    from rules import reward_engine
+    from telemetry import telemetry_store
+
+    with app.app_context():
+        db.drop_all()
+        init_db()
+        if hasattr(cache.backend, 'entries'):
+            cache.backend.entries.clear()
+        cache.versions.clear()
+        reward_engine.compiled = None
+        telemetry_store.buffers.clear()
+        telemetry_store.device_keys.clear()
+        yield db
+        db.session.remove()
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+@pytest.fixture
+def admin_headers(client):
+    response = client.post('/api/admin/login', json={'username': 'admin', 'password': 'admin123'})
+    return {'Authorization': f"Bearer {response.json['token']}"}
+
+@pytest.fixture
+def make_user(client):
+    """Register a user and return (auth headers, user id)"""
+    def make(phone='9000000001', address='12 FC Road, Shivajinagar, Pune'):
+        user = client.post('/api/users/register', json={'name': 'Test User', 'phone': phone, 'address': address}).json['user']
+        token = client.post('/api/users/authenticate', json={'qr_code': user['qr_code']}).json['token']
+        return {'Authorization': f'Bearer {token}'}, user['id']
+    return make
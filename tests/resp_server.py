@@ -0,0 +1,117 @@
+"""In-process server speaking enough of the Redis protocol (RESP) to test cache.RedisBackend"""
+import socket
+import socketserver
+import threading
+import time
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """Threaded RESP server on a free localhost port with GET, SET (NX, EX, PX), DEL, INCR and PING"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}  # key -> (value, expires_at or None)
+        self.data_lock = threading.Lock()
+        self.commands = []
+        self.connections = set()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+    def drop_connections(self):
+        """Close every client connection, as a server restart would"""
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def live(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def run(self, command, args):
+        with self.data_lock:
+            self.commands.append(command)
+            if command == 'PING':
+                return 'PONG'
+            if command == 'GET':
+                entry = self.live(args[0])
+                return entry[0] if entry else None
+            if command == 'SET':
+                key, value, options = args[0], args[1], [a.decode().upper() for a in args[2:]]
+                expires = None
+                if 'PX' in options:
+                    expires = time.time() + int(options[options.index('PX') + 1]) / 1000
+                if 'EX' in options:
+                    expires = time.time() + int(options[options.index('EX') + 1])
+                if 'NX' in options and self.live(key):
+                    return None
+                self.data[key] = (value, expires)
+                return 'OK'
+            if command == 'DEL':
+                deleted = 0
+                for key in args:
+                    if self.live(key):
+                        del self.data[key]
+                        deleted += 1
+                return deleted
+            if command == 'INCR':
+                entry = self.live(args[0])
+                value = int(entry[0]) + 1 if entry else 1
+                self.data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+                return value
+            return RuntimeError(f'ERR unknown command {command}')
+
+class RespHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.connections.add(self.connection)
+        try:
+            while True:
+                args = self.read_command()
+                if args is None:
+                    return
+                self.wfile.write(encode(self.server.run(args[0].decode().upper(), args[1:])))
+        except (OSError, ValueError):
+            return
+        finally:
+            self.server.connections.discard(self.connection)
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, Exception):
+        return f'-{value}\r\n'.encode()
+    if isinstance(value, str):
+        return f'+{value}\r\n'.encode()
+    if isinstance(value, int):
+        return f':{value}\r\n'.encode()
+    return f'${len(value)}\r\n'.encode() + value + b'\r\n'
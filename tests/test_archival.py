@@ -0,0 +1,61 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+import archival
+from models import Disposal, DisposalArchive, DisposalSummary
+
+def day_start(days_ago):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days_ago)
+
+@pytest.fixture
+def disposals(database, make_user):
+    _, first = make_user('9000000001')
+    _, second = make_user('9000000002')
+    rows = []
+    for i, days_ago in enumerate([20, 20, 15, 12, 3, 1]):
+        for user_id in [first, second]:
+            rows.append(Disposal(user_id=user_id, waste_type=['dry', 'wet'][i % 2], weight=1.25 + i,
+                                 points_earned=10 + i, timestamp=day_start(days_ago) + timedelta(hours=9 + i)))
+    database.session.add_all(rows)
+    database.session.commit()
+    return rows
+
+def assert_totals_match(before, after):
+    assert before.keys() == after.keys()
+    for key, entry in before.items():
+        assert after[key]['count'] == entry['count']
+        assert math.isclose(after[key]['weight'], entry['weight'])
+        assert after[key].get('points') == entry.get('points')
+
+def test_totals_match_before_and_after_archival(disposals):
+    ranges = [(None, None), (day_start(30), day_start(0)), (day_start(16), day_start(2)), (day_start(5), None)]
+    before = [(archival.disposal_totals(start, end), archival.user_totals(start, end)) for start, end in ranges]
+
+    # A small batch size exercises several transactions folding into the same summaries
+    assert archival.archive_disposals(7, 3) == 8
+
+    assert Disposal.query.count() == 4
+    assert DisposalArchive.query.count() == 8
+    for (totals, users), (start, end) in zip(before, ranges):
+        assert_totals_match(totals, archival.disposal_totals(start, end))
+        assert_totals_match(users, archival.user_totals(start, end))
+
+def test_user_totals_match_before_and_after_archival(disposals):
+    user_id = disposals[0].user_id
+    before = archival.disposal_totals(user_id=user_id)
+
+    archival.archive_disposals(7, 2)
+
+    assert_totals_match(before, archival.disposal_totals(user_id=user_id))
+    assert before['dry']['count'] + before['wet']['count'] == 6
+
+def test_archiving_twice_moves_nothing_new(disposals):
+    assert archival.archive_disposals(7) == 8
+    summaries = DisposalSummary.query.count()
+
+    assert archival.archive_disposals(7) == 0
+    assert DisposalSummary.query.count() == summaries
+    assert archival.archived_until() == max(d.timestamp for d in DisposalArchive.query.all())
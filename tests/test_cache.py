@@ -0,0 +1,164 @@
+import io
+import threading
+import time
+
+import pytest
+
+import server
+from cache import Cache, MemoryBackend, RedisBackend, CACHE_CONFIG
+from profiler import count_queries
+from .resp_server import RespServer
+
+@pytest.fixture
+def resp_server():
+    server_ = RespServer().start()
+    yield server_
+    server_.stop()
+
+@pytest.fixture
+def redis_cache(resp_server):
+    return Cache(RedisBackend(resp_server.url))
+
+def reply(data):
+    return RedisBackend()._reply(io.BytesIO(data))
+
+def test_reply_parser_decodes_every_type():
+    assert reply(b'+OK\r\n') == 'OK'
+    assert reply(b':42\r\n') == 42
+    assert reply(b'$5\r\nhe\r\no\r\n') == b'he\r\no'
+    assert reply(b'$0\r\n\r\n') == b''
+    assert reply(b'$-1\r\n') is None
+    assert reply(b'*-1\r\n') is None
+    assert reply(b'*3\r\n:1\r\n$1\r\na\r\n*1\r\n+x\r\n') == [1, b'a', ['x']]
+
+def test_reply_parser_raises_on_errors_and_closed_connections():
+    with pytest.raises(RuntimeError, match='WRONGTYPE'):
+        reply(b'-WRONGTYPE bad value\r\n')
+    with pytest.raises(ConnectionError):
+        reply(b'')
+    with pytest.raises(RuntimeError, match='Unexpected reply'):
+        reply(b'?what\r\n')
+
+def test_backend_round_trips_values_and_counters(resp_server):
+    backend = RedisBackend(resp_server.url)
+    assert backend.execute('PING') == 'PONG'
+    backend.set('report', {'total': 3, 'items': [1.5, None]})
+    assert backend.get('report') == {'total': 3, 'items': [1.5, None]}
+    assert backend.get('missing') is None
+    assert backend.counter('version:x') == 0
+    assert backend.incr('version:x') == 1
+    assert backend.counter('version:x') == 1
+    backend.delete('report')
+    assert backend.get('report') is None
+
+def test_backend_reconnects_after_dropped_connection(resp_server):
+    backend = RedisBackend(resp_server.url)
+    backend.set('key', 1)
+    resp_server.drop_connections()
+    assert backend.get('key') == 1
+
+def test_set_nx_px_lock(resp_server):
+    backend = RedisBackend(resp_server.url)
+    assert backend.add('lock:a', 1, 0.2)
+    assert not backend.add('lock:a', 1, 0.2)
+    time.sleep(0.25)
+    assert backend.add('lock:a', 1, 0.2)
+
+def test_invalidation_is_seen_by_every_worker(resp_server, monkeypatch):
+    monkeypatch.setitem(CACHE_CONFIG, 'version_ttl', 0)
+    first, second = Cache(RedisBackend(resp_server.url)), Cache(RedisBackend(resp_server.url))
+    first.set('rewards', 'active', ['old'])
+    assert second.get('rewards', 'active') == ['old']
+
+    second.invalidate('rewards')
+    assert first.get('rewards', 'active') is None
+    first.set('rewards', 'active', ['new'])
+    assert second.get('rewards', 'active') == ['new']
+
+def test_get_or_compute_runs_compute_once_under_contention(redis_cache):
+    calls = []
+    started = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'report'
+
+    results = []
+    def worker():
+        started.wait()
+        results.append(redis_cache.get_or_compute('reports', 'monthly', compute))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['report'] * 8
+    assert len(calls) == 1
+    assert redis_cache.locks == {}
+
+def test_local_lock_outlives_the_thread_that_created_it():
+    cache = Cache(MemoryBackend())
+    full_key = cache.key('reports', 'monthly')
+    release = {name: threading.Event() for name in ['first', 'second']}
+    running = []
+
+    def compute(name):
+        running.append(name)
+        release[name].wait(5)
+        return None  # nothing cached, so the waiting thread computes too
+
+    first = threading.Thread(target=cache.get_or_compute, args=('reports', 'monthly', lambda: compute('first')))
+    second = threading.Thread(target=cache.get_or_compute, args=('reports', 'monthly', lambda: compute('second')))
+    first.start()
+    while running != ['first']:
+        time.sleep(0.01)
+    second.start()
+    while cache.locks[full_key][1] != 2:
+        time.sleep(0.01)
+
+    release['first'].set()
+    first.join()
+    while running != ['first', 'second']:
+        time.sleep(0.01)
+    # A thread arriving now must queue behind the second one rather than create a fresh lock
+    assert cache.locks[full_key][1] == 1
+
+    release['second'].set()
+    second.join()
+    assert cache.locks == {}
+
+def test_get_or_compute_waits_for_another_worker(resp_server):
+    first, second = Cache(RedisBackend(resp_server.url)), Cache(RedisBackend(resp_server.url))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return 'report'
+
+    thread = threading.Thread(target=first.get_or_compute, args=('reports', 'monthly', compute))
+    thread.start()
+    time.sleep(0.1)
+    assert second.get_or_compute('reports', 'monthly', compute) == 'report'
+    thread.join()
+    assert len(calls) == 1
+
+def test_principal_cache_with_shared_backend(client, make_user, redis_cache, monkeypatch):
+    monkeypatch.setattr(server, 'cache', redis_cache)
+    headers, user_id = make_user()
+
+    with count_queries() as cold:
+        client.get('/api/users/profile', headers=headers)
+    with count_queries() as warm:
+        response = client.get('/api/users/profile', headers=headers)
+    assert warm.count == cold.count - 1
+    assert response.json['user']['reward_points'] == 0
+
+    # A disposal drops the cached row, so the next request sees the new balance
+    client.post('/api/disposal/log', json={'waste_type': 'dry', 'weight': 2}, headers=headers)
+    balance = client.get('/api/users/profile', headers=headers).json['user']['reward_points']
+    assert balance > 0
+    assert redis_cache.get('principals', f'users:{user_id}')['reward_points'] == balance
@@ -0,0 +1,102 @@
+import csv
+import io
+import time
+import zipfile
+
+import pytest
+
+from models import User
+from onboarding import import_users, acquire_import_slot, release_import_slot, ImportProgress, ONBOARDING_CONFIG
+
+ROWS = [
+    ('Asha Patil', '9100000001', '4 FC Road, Shivajinagar, Pune'),
+    ('', '9100000002', '5 FC Road, Shivajinagar, Pune'),                # missing name
+    ('Ravi Kulkarni', '9' * 16, '6 FC Road, Shivajinagar, Pune'),       # phone too long
+    ('Meera Joshi', '9100000003', '7 Baner Road, Baner, Pune'),
+    ('Meera J', '9100000003', '7 Baner Road, Baner, Pune'),             # repeated in the file
+    ('Already Here', '9000000001', '12 FC Road, Shivajinagar, Pune'),   # registered before the import
+    ('Kiran Deshmukh', '9100000004', ''),                               # missing address
+    ('Neha Shah', '9100000005', '9 Aundh Road, Aundh, Pune'),
+]
+
+def csv_stream(rows, header=('name', 'phone', 'address')):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(ONBOARDING_CONFIG, 'output_dir', str(tmp_path))
+    monkeypatch.setitem(ONBOARDING_CONFIG, 'render_workers', 1)
+    return tmp_path
+
+def test_import_rejects_invalid_rows_and_imports_the_rest(make_user, tmp_path):
+    make_user('9000000001')
+
+    state = import_users(csv_stream(ROWS), tmp_path, chunk_size=3, workers=1)
+
+    assert state['status'] == 'completed'
+    assert (state['rows_read'], state['imported'], state['errors'], state['duplicates']) == (8, 3, 5, 2)
+    assert state['qr_rendered'] == 3
+    assert ImportProgress.read(tmp_path)['imported'] == 3
+
+    with open(tmp_path / 'errors.csv', newline='') as f:
+        errors = [(int(r['line']), r['phone'], r['error']) for r in csv.DictReader(f)]
+    assert errors == [
+        (3, '9100000002', 'name is required'),
+        (4, '9' * 16, 'phone must be at most 15 characters'),
+        (6, '9100000003', 'Duplicate phone in file'),
+        (7, '9000000001', 'Phone number already registered'),
+        (8, '9100000004', 'address is required'),
+    ]
+
+    imported = User.query.filter(User.phone.in_(['9100000001', '9100000003', '9100000005'])).all()
+    assert sorted(u.name for u in imported) == ['Asha Patil', 'Meera Joshi', 'Neha Shah']
+    assert User.query.filter_by(phone='9000000001').one().name == 'Test User'
+
+    with zipfile.ZipFile(tmp_path / 'codes.zip') as codes:
+        manifest = list(csv.DictReader(io.StringIO(codes.read('manifest.csv').decode())))
+        assert sorted(row['phone'] for row in manifest) == ['9100000001', '9100000003', '9100000005']
+        assert all(codes.read(row['file']).startswith(b'\x89PNG') for row in manifest)
+
+def test_import_fails_on_missing_columns(database, tmp_path):
+    with pytest.raises(ValueError, match='address'):
+        import_users(csv_stream(ROWS, header=('name', 'phone', 'street')), tmp_path, workers=1)
+    assert ImportProgress.read(tmp_path)['status'] == 'failed'
+    assert User.query.count() == 0
+
+def test_import_endpoint_reports_progress_and_errors(client, admin_headers, output_dir):
+    response = client.post('/api/admin/users/import', headers=admin_headers,
+                           data=csv_stream(ROWS).getvalue(), content_type='text/csv')
+    assert response.status_code == 202
+    status_url = response.json['status_url']
+
+    deadline = time.time() + 60
+    progress = client.get(status_url, headers=admin_headers).json
+    while progress['status'] == 'running' and time.time() < deadline:
+        time.sleep(0.2)
+        progress = client.get(status_url, headers=admin_headers).json
+    assert progress['status'] == 'completed'
+    assert (progress['imported'], progress['errors']) == (4, 4)
+
+    errors = client.get(progress['errors_url'], headers=admin_headers).get_data(as_text=True)
+    assert len(errors.strip().splitlines()) == 5
+    assert 'Duplicate phone in file' in errors
+
+    # The import thread releases its slot just after reporting completion
+    slot = None
+    while slot is None and time.time() < deadline:
+        slot = acquire_import_slot()
+    release_import_slot(slot)
+
+def test_only_one_import_runs_at_a_time(client, admin_headers, output_dir):
+    slot = acquire_import_slot()
+    try:
+        response = client.post('/api/admin/users/import', headers=admin_headers,
+                               data=csv_stream(ROWS).getvalue(), content_type='text/csv')
+        assert response.status_code == 429
+    finally:
+        release_import_slot(slot)
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+import archival
+from profiler import assert_query_budget
+
+USERS = 8
+
+@pytest.fixture
+def populated(client, make_user):
+    """Several users with both archived and hot disposals, so per-row queries would exceed the budgets"""
+    user_headers = []
+    for i in range(USERS):
+        headers, _ = make_user(f'90000{i:05d}')
+        user_headers.append(headers)
+        client.post('/api/disposal/log', json={'waste_type': 'dry', 'weight': 2}, headers=headers)
+    archival.archive_disposals(-1)
+    for headers in user_headers:
+        client.post('/api/disposal/log', json={'waste_type': 'wet', 'weight': 1}, headers=headers)
+    return user_headers
+
+def test_admin_users_budget(client, admin_headers, populated):
+    response = assert_query_budget(client, 'GET', '/api/admin/users', 4, headers=admin_headers)
+    assert response.json['total_users'] == USERS
+
+def test_admin_disposals_budget(client, admin_headers, populated):
+    response = assert_query_budget(client, 'GET', '/api/admin/disposals', 5, headers=admin_headers)
+    assert response.json['total'] == 2 * USERS
+    assert 'Unknown' not in {d['user_name'] for d in response.json['disposals']}
+
+def test_monthly_report_budget(client, admin_headers, populated):
+    now = datetime.now()
+    url = f'/api/admin/reports/monthly?year={now.year}&month={now.month}'
+    response = assert_query_budget(client, 'GET', url, 7, headers=admin_headers)
+    assert len(response.json['top_users']) == 5
+    assert response.json['summary']['total_disposals'] == 2 * USERS
+
+def test_user_profile_budget(client, populated):
+    response = assert_query_budget(client, 'GET', '/api/users/profile', 4, headers=populated[0])
+    assert response.json['statistics']['total_disposals'] == 2
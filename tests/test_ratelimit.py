@@ -0,0 +1,76 @@
+import time
+
+import pytest
+from flask import Flask
+
+import ratelimit
+from ratelimit import RateLimiter, by_ip, init_proxy_fix, RATE_LIMIT_CONFIG
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setitem(RATE_LIMIT_CONFIG, 'enabled', True)
+
+def login(client, ip, password='wrong'):
+    return client.post('/api/admin/login', json={'username': 'admin', 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+def test_bucket_allows_a_burst_then_refills():
+    limiter = RateLimiter('test', '10/1')
+    assert all(limiter.allow('client')[0] for _ in range(10))
+
+    allowed, retry_after = limiter.allow('client')
+    assert not allowed
+    assert 0 < retry_after <= 0.1
+
+    time.sleep(0.15)
+    assert limiter.allow('client')[0]
+    assert not limiter.allow('client')[0]
+    # Other keys have their own buckets
+    assert limiter.allow('other')[0]
+
+def test_least_recently_used_keys_are_evicted():
+    limiter = RateLimiter('test', '1/60', max_keys=2)
+    limiter.allow('a')
+    limiter.allow('b')
+    limiter.allow('a')
+    limiter.allow('c')
+
+    assert list(limiter.buckets) == ['a', 'c']
+    assert limiter.evicted == 1
+    # An evicted key comes back with a full bucket
+    assert limiter.allow('b')[0]
+
+def test_login_is_limited_per_ip_without_locking_out_the_admin(client, enabled, monkeypatch):
+    monkeypatch.setitem(ratelimit.limiters, 'login', RateLimiter('login', '2/60'))
+    assert login(client, '203.0.113.7').status_code == 401
+    assert login(client, '203.0.113.7').status_code == 401
+
+    response = login(client, '203.0.113.7')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    # Failed attempts from one address do not block the admin elsewhere
+    assert login(client, '198.51.100.1', 'admin123').status_code == 200
+
+def test_limits_are_skipped_when_disabled(client, monkeypatch):
+    monkeypatch.setitem(ratelimit.limiters, 'login', RateLimiter('login', '1/60'))
+    assert [login(client, '203.0.113.7').status_code for _ in range(3)] == [401, 401, 401]
+
+def test_load_is_shed_with_503(client, enabled, monkeypatch):
+    monkeypatch.setattr(ratelimit.concurrency, 'max_concurrent', 0)
+
+    response = client.get('/api/rewards')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(RATE_LIMIT_CONFIG['shed_retry_after'])
+    assert client.get('/api/health').status_code == 200
+    assert ratelimit.concurrency.in_flight == 0
+
+@pytest.mark.parametrize('trusted_proxies, expected', [(0, '10.0.0.1'), (1, '203.0.113.7')])
+def test_client_ip_behind_a_proxy(trusted_proxies, expected):
+    app = Flask(__name__)
+    app.add_url_rule('/ip', 'ip', by_ip)
+    init_proxy_fix(app, trusted_proxies)
+
+    response = app.test_client().get('/ip', headers={'X-Forwarded-For': '198.51.100.9, 203.0.113.7'},
+                                     environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.get_data(as_text=True) == expected
@@ -0,0 +1,62 @@
+from sqlalchemy import update
+
+import reconcile
+from models import User
+from reconcile import find_mismatches, repair
+
+def log_disposals(client, headers, weights):
+    for weight in weights:
+        client.post('/api/disposal/log', json={'waste_type': 'dry', 'weight': weight}, headers=headers)
+
+def set_points(database, user_id, points):
+    database.session.execute(update(User).where(User.id == user_id).values(reward_points=points))
+    database.session.commit()
+
+def balance(database, user_id):
+    return database.session.query(User.reward_points).filter(User.id == user_id).scalar()
+
+def test_detects_and_repairs_drift(client, database, make_user):
+    headers, drifted = make_user('9000000001')
+    other_headers, clean = make_user('9000000002')
+    log_disposals(client, headers, [2, 3])
+    log_disposals(client, other_headers, [1])
+    expected = balance(database, drifted)
+    assert list(find_mismatches()) == []
+
+    set_points(database, drifted, expected + 40)
+    assert list(find_mismatches(chunk_size=1)) == [(drifted, expected + 40, expected)]
+
+    assert repair(find_mismatches(), batch_size=1) == 1
+    assert balance(database, drifted) == expected
+    assert list(find_mismatches()) == []
+    assert balance(database, clean) > 0
+
+def test_repairs_null_balances(client, database, make_user):
+    headers, earned = make_user('9000000001')
+    _, idle = make_user('9000000002')
+    log_disposals(client, headers, [2])
+    expected = balance(database, earned)
+    set_points(database, earned, None)
+    set_points(database, idle, None)
+
+    assert sorted(find_mismatches()) == [(earned, 0, expected), (idle, 0, 0)]
+    assert repair(find_mismatches()) == 2
+    assert (balance(database, earned), balance(database, idle)) == (expected, 0)
+
+def test_balance_changed_after_recheck_is_neither_overwritten_nor_counted(client, database, make_user, monkeypatch):
+    headers, user_id = make_user()
+    log_disposals(client, headers, [2])
+    expected = balance(database, user_id)
+    set_points(database, user_id, expected + 40)
+    mismatches = list(find_mismatches())
+
+    original = reconcile.ledger_points
+    def ledger_then_concurrent_write(user_ids):
+        totals = original(user_ids)
+        # Another request changes the balance between the re-check and the update
+        database.session.execute(update(User).where(User.id == user_id).values(reward_points=7))
+        return totals
+    monkeypatch.setattr(reconcile, 'ledger_points', ledger_then_concurrent_write)
+
+    assert repair(mismatches) == 0
+    assert balance(database, user_id) == 7
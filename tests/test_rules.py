@@ -0,0 +1,94 @@
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rules import CompiledRules, validate_rule
+
+def rule(id, kind, params, waste_type=None, starts_at=None, ends_at=None):
+    return SimpleNamespace(id=id, kind=kind, params=params, waste_type=waste_type,
+                           starts_at=starts_at, ends_at=ends_at)
+
+CAMPAIGN_START = datetime(2024, 6, 10)
+CAMPAIGN_END = datetime(2024, 6, 20)
+
+RULES = [
+    rule(1, 'base_rate', {'points_per_kg': 10}, 'dry'),
+    rule(2, 'base_rate', {'points_per_kg': 5}, 'wet'),
+    rule(3, 'base_rate', {'points_per_kg': 12.5}, 'dry', CAMPAIGN_START, CAMPAIGN_END),
+    rule(4, 'time_multiplier', {'start_hour': 22, 'end_hour': 6, 'multiplier': 1.5}),
+    rule(5, 'time_multiplier', {'start_hour': 7, 'end_hour': 9, 'multiplier': 2}, 'wet', CAMPAIGN_START),
+    rule(6, 'bin_bonus', {'bin_id': 3, 'multiplier': 1.25, 'bonus_points': 4}),
+    rule(7, 'bin_bonus', {'bin_id': 8, 'bonus_points': 2}, 'dry'),
+    rule(8, 'weight_cap', {'max_kg': 8}),
+    rule(9, 'streak_bonus', {'min_days': 3, 'bonus_points': 5}),
+    rule(10, 'streak_bonus', {'min_days': 7, 'bonus_points': 20}, None, None, CAMPAIGN_END),
+]
+
+@pytest.mark.parametrize('params', [
+    {'points_per_kg': 'nan'},
+    {'points_per_kg': float('inf')},
+    {'points_per_kg': '-Infinity'},
+])
+def test_validate_rule_rejects_non_finite_rates(params):
+    assert validate_rule('base_rate', 'dry', params) == 'params.points_per_kg must be a finite number'
+
+def test_validate_rule_rejects_non_finite_multiplier_and_cap():
+    assert validate_rule('time_multiplier', None, {'start_hour': 6, 'end_hour': 9, 'multiplier': 'inf'})
+    assert validate_rule('bin_bonus', None, {'bin_id': 1, 'multiplier': float('nan')})
+    assert validate_rule('weight_cap', None, {'max_kg': 'Infinity'})
+
+def test_validate_rule_hour_ranges():
+    assert validate_rule('time_multiplier', None, {'start_hour': 6, 'end_hour': 6, 'multiplier': 2})
+    assert validate_rule('time_multiplier', None, {'start_hour': 0, 'end_hour': 24, 'multiplier': 2}) is None
+    assert validate_rule('time_multiplier', None, {'start_hour': 22, 'end_hour': 6, 'multiplier': 2}) is None
+
+def test_api_rejects_invalid_params(client, admin_headers, make_user):
+    response = client.post('/api/admin/reward-rules', headers=admin_headers,
+                           data='{"name": "Broken", "kind": "base_rate", "waste_type": "dry", "params": {"points_per_kg": NaN}}',
+                           content_type='application/json')
+    assert response.status_code == 400
+
+    assert client.post('/api/admin/reward-rules', headers=admin_headers, json={
+        'name': 'Morning', 'kind': 'time_multiplier', 'params': {'start_hour': 9, 'end_hour': 9, 'multiplier': 2}
+    }).status_code == 400
+
+    # Nothing was stored, so disposals keep earning the default rates
+    headers, _ = make_user()
+    response = client.post('/api/disposal/log', json={'waste_type': 'dry', 'weight': 2}, headers=headers)
+    assert response.status_code == 201
+
+def test_all_day_multiplier_covers_every_hour():
+    compiled = CompiledRules([rule(1, 'time_multiplier', {'start_hour': 0, 'end_hour': 24, 'multiplier': 2})])
+    assert (compiled.hour_multiplier == 2).all()
+
+def test_points_and_points_batch_agree():
+    compiled = CompiledRules(RULES, utc_offset_minutes=330)
+    rng = random.Random(42)
+    size = 2000
+    waste_types = [rng.choice(['dry', 'wet', 'glass']) for _ in range(size)]
+    weights = [round(rng.uniform(0, 12), 3) for _ in range(size)]
+    timestamps = [CAMPAIGN_START + timedelta(seconds=rng.randint(-5 * 86400, 15 * 86400)) for _ in range(size)]
+    bin_ids = [rng.choice([-1, 1, 3, 8, 12]) for _ in range(size)]
+    streaks = [rng.randint(0, 10) for _ in range(size)]
+
+    batch = compiled.points_batch(waste_types, weights, timestamps, bin_ids, streaks)
+    scalar = [compiled.points(w, kg, when, None if b == -1 else b, s)
+              for w, kg, when, b, s in zip(waste_types, weights, timestamps, bin_ids, streaks)]
+
+    assert batch.dtype == np.int64
+    assert batch.tolist() == scalar
+    # Every rule kind actually contributed to some of the sampled disposals
+    assert len(set(scalar)) > 50
+
+def test_points_at_campaign_boundaries():
+    compiled = CompiledRules(RULES, utc_offset_minutes=0)
+    noon = timedelta(hours=12)
+    before, during, after = CAMPAIGN_START - timedelta(days=1) + noon, CAMPAIGN_START + noon, CAMPAIGN_END + noon
+
+    assert compiled.points('dry', 2, before) == 20
+    assert compiled.points('dry', 2, during) == 25
+    assert compiled.points('dry', 2, after) == 20
+    assert compiled.points_batch(['dry'] * 3, [2] * 3, [before, during, after]).tolist() == [20, 25, 20]
@@ -0,0 +1,162 @@
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import telemetry
+from models import Bin, BinTelemetry
+from telemetry import TelemetryStore, downsample
+
+BUCKET = 60
+
+def minute_start(minutes_ago=2):
+    return (time.time() // BUCKET - minutes_ago) * BUCKET
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+@pytest.fixture
+def bin_(database):
+    bin_ = Bin(name='FC Road Dry 1', waste_type='dry', location='FC Road', capacity_kg=50)
+    database.session.add(bin_)
+    database.session.commit()
+    return bin_
+
+@pytest.fixture
+def registered_bin(client, admin_headers):
+    return client.post('/api/admin/bins', headers=admin_headers, json={
+        'name': 'FC Road Dry 1', 'waste_type': 'dry', 'location': 'FC Road', 'capacity_kg': 50
+    }).json['bin']
+
+def test_downsample_groups_samples_by_bucket():
+    ts = np.array([0.0, 10.0, 59.0, 60.0, 130.0])
+    fill = np.array([10, 20, 30, 40, 50], dtype=np.float32)
+    weight = np.array([1, 2, 3, 4, 5], dtype=np.float32)
+
+    agg = downsample(ts, fill, weight, BUCKET)
+
+    assert agg['bucket_start'].tolist() == [0, 60, 120]
+    assert agg['sample_count'].tolist() == [3, 1, 1]
+    assert agg['fill_min'].tolist() == [10, 40, 50]
+    assert agg['fill_max'].tolist() == [30, 40, 50]
+    assert agg['fill_avg'].tolist() == [20, 40, 50]
+
+def test_flush_writes_only_completed_buckets(database, bin_):
+    store = TelemetryStore()
+    start = minute_start()
+    store.ingest(bin_.id, 10, 1.0, start + 1)
+    store.ingest(bin_.id, 20, 2.0, start + BUCKET + 1)
+
+    assert store.flush(now=start + BUCKET + 30) == 1
+    assert BinTelemetry.query.count() == 1
+
+    assert store.flush(now=start + 3 * BUCKET) == 1
+    assert BinTelemetry.query.count() == 2
+
+def test_flushes_from_several_workers_merge_into_one_row(database, bin_):
+    start = minute_start()
+    first, second = TelemetryStore(), TelemetryStore()
+    for i, fill in enumerate([10, 11, 12, 13]):
+        first.ingest(bin_.id, fill, 1.0, start + i)
+    for i, fill in enumerate([50, 51]):
+        second.ingest(bin_.id, fill, 4.0, start + 10 + i)
+
+    first.flush(now=start + 2 * BUCKET)
+    second.flush(now=start + 2 * BUCKET)
+
+    rows = BinTelemetry.query.all()
+    assert len(rows) == 1
+    row = rows[0]
+    assert row.sample_count == 6
+    assert (row.fill_min, row.fill_max) == (10, 51)
+    assert math.isclose(row.fill_avg, (10 + 11 + 12 + 13 + 50 + 51) / 6)
+    assert math.isclose(row.weight_avg, (4 * 1.0 + 2 * 4.0) / 6)
+
+def test_older_flush_does_not_overwrite_newer_state(database, bin_):
+    start = minute_start()
+    newer, older = TelemetryStore(), TelemetryStore()
+    newer.ingest(bin_.id, 70, 7.0, start + 30)
+    older.ingest(bin_.id, 20, 2.0, start + 5)
+
+    newer.flush(now=start + 2 * BUCKET)
+    older.flush(now=start + 2 * BUCKET)
+
+    database.session.refresh(bin_)
+    assert bin_.fill_level == 70
+    # The older worker still reports the newer flushed state
+    assert older.fill_state(bin_)['fill_level'] == 70
+
+def test_failed_flush_keeps_samples_buffered(database, bin_, monkeypatch):
+    store = TelemetryStore({'flush_interval': 0})
+    start = minute_start()
+    store.ingest(bin_.id, 10, 1.0, start + 1)
+
+    def fail(*args):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr(telemetry, 'save_bucket', fail)
+    assert store.maybe_flush() == 0
+
+    monkeypatch.undo()
+    store.last_flush = 0
+    assert store.maybe_flush() == 1
+
+def test_ingest_batch_skips_samples_older_than_buffered(database, bin_):
+    store = TelemetryStore()
+    start = minute_start()
+    assert store.ingest_batch(bin_.id, [(start + 1, 10, 1.0), (start + 2, 11, 1.0)]) == 2
+    assert store.ingest_batch(bin_.id, [(start + 1, 10, 1.0), (start + 2, 11, 1.0), (start + 3, 12, 1.0)]) == 2
+
+def test_ingest_rejects_non_finite_values(client, registered_bin):
+    response = client.post(f"/api/bins/{registered_bin['id']}/telemetry",
+                           data='{"fill_level": NaN, "weight": 1}', content_type='application/json',
+                           headers={'X-Bin-Key': registered_bin['device_key']})
+    assert response.status_code == 400
+
+def test_ingest_caps_batch_size(client, registered_bin):
+    start = minute_start()
+    samples = [{'fill_level': 10, 'weight': 1, 'timestamp': iso(start + i)}
+               for i in range(telemetry.TELEMETRY_CONFIG['max_batch_samples'] + 1)]
+    response = client.post(f"/api/bins/{registered_bin['id']}/telemetry", json={'samples': samples},
+                           headers={'X-Bin-Key': registered_bin['device_key']})
+    assert response.status_code == 400
+
+def test_batch_requires_ordered_timestamps(client, registered_bin):
+    url = f"/api/bins/{registered_bin['id']}/telemetry"
+    headers = {'X-Bin-Key': registered_bin['device_key']}
+    start = minute_start()
+
+    untimed = [{'fill_level': 10, 'weight': 1}, {'fill_level': 11, 'weight': 1}]
+    assert client.post(url, json={'samples': untimed}, headers=headers).status_code == 400
+
+    unordered = [{'fill_level': 10, 'weight': 1, 'timestamp': iso(start + 5)},
+                 {'fill_level': 11, 'weight': 1, 'timestamp': iso(start + 1)}]
+    assert client.post(url, json={'samples': unordered}, headers=headers).status_code == 400
+
+    future = [{'fill_level': 10, 'weight': 1, 'timestamp': iso(time.time() + 3600)}]
+    assert client.post(url, json={'samples': future}, headers=headers).status_code == 400
+
+def test_batch_samples_land_in_their_own_buckets(client, registered_bin):
+    start = minute_start(3)
+    samples = [{'fill_level': 10 + i, 'weight': 1, 'timestamp': iso(start + i * BUCKET)} for i in range(3)]
+    response = client.post(f"/api/bins/{registered_bin['id']}/telemetry", json={'samples': samples},
+                           headers={'X-Bin-Key': registered_bin['device_key']})
+    assert response.status_code == 202
+    assert response.json['samples'] == 3
+
+    assert telemetry.telemetry_store.flush() == 3
+    assert BinTelemetry.query.count() == 3
+
+def test_update_bin_requires_boolean_active(client, admin_headers, registered_bin):
+    url = f"/api/admin/bins/{registered_bin['id']}"
+    assert client.put(url, headers=admin_headers, json={'active': 'false'}).status_code == 400
+    assert client.put(url, headers=admin_headers, json={'active': False}).status_code == 200
+
+def test_deactivated_bin_key_is_rejected(client, admin_headers, registered_bin):
+    url = f"/api/bins/{registered_bin['id']}/telemetry"
+    headers = {'X-Bin-Key': registered_bin['device_key']}
+    assert client.post(url, json={'fill_level': 10, 'weight': 1}, headers=headers).status_code == 202
+
+    client.put(f"/api/admin/bins/{registered_bin['id']}", headers=admin_headers, json={'active': False})
+    assert client.post(url, json={'fill_level': 10, 'weight': 1}, headers=headers).status_code == 401
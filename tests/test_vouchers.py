@@ -0,0 +1,90 @@
+import logging
+import threading
+
+import pytest
+from sqlalchemy import update
+
+from models import User, Reward, Redemption, VoucherCode
+from vouchers import redeem, REDEEMED, OUT_OF_STOCK
+
+CODES = ['CODE-A', 'CODE-B', 'CODE-C', 'CODE-D']
+
+@pytest.fixture
+def reward(client, database, admin_headers):
+    reward = Reward(name='Cafe voucher', description='Cafe voucher', points_required=10, active=True)
+    database.session.add(reward)
+    database.session.commit()
+    response = client.post(f'/api/admin/rewards/{reward.id}/vouchers', headers=admin_headers,
+                           json={'codes': CODES, 'low_stock_threshold': 2})
+    assert response.status_code in (200, 201)
+    return reward.id
+
+def rich_user(database, make_user, phone='9000000001', points=1000):
+    headers, user_id = make_user(phone)
+    database.session.execute(update(User).where(User.id == user_id).values(reward_points=points))
+    database.session.commit()
+    return headers, user_id
+
+def test_redemptions_get_distinct_codes_until_the_pool_is_empty(client, database, make_user, reward):
+    headers, user_id = rich_user(database, make_user)
+
+    codes = [client.post('/api/rewards/redeem', json={'reward_id': reward}, headers=headers).json['redemption']['voucher_code']
+             for _ in CODES]
+    assert sorted(codes) == CODES
+
+    response = client.post('/api/rewards/redeem', json={'reward_id': reward}, headers=headers)
+    assert response.status_code == 409
+    # The failed redemption left no trace
+    assert database.session.get(User, user_id).reward_points == 1000 - 10 * len(CODES)
+    assert Redemption.query.count() == len(CODES)
+
+def test_concurrent_redemptions_never_share_a_code(app, database, make_user, reward):
+    user_ids = [rich_user(database, make_user, f'900000000{i}')[1] for i in range(4)]
+    claimed, outcomes = [], []
+    lock = threading.Lock()
+
+    def worker(user_id):
+        with app.app_context():
+            reward_ = database.session.get(Reward, reward)
+            for _ in range(3):
+                try:
+                    outcome, _, code = redeem(user_id, reward_)
+                except Exception:
+                    database.session.rollback()
+                    outcome, code = None, None
+                with lock:
+                    outcomes.append(outcome)
+                    if code:
+                        claimed.append(code)
+            database.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == len(set(claimed)) == outcomes.count(REDEEMED)
+    assert OUT_OF_STOCK in outcomes
+    assert len(claimed) + VoucherCode.query.filter_by(status='available').count() == len(CODES)
+    assert Redemption.query.count() == len(claimed)
+
+def test_low_stock_alerts_once_per_level(client, database, make_user, admin_headers, reward, caplog):
+    headers, _ = rich_user(database, make_user)
+
+    def alerts():
+        return [r.getMessage().split(' for ')[0] for r in caplog.records
+                if r.name == 'vouchers' and r.levelno == logging.WARNING]
+
+    with caplog.at_level(logging.WARNING, logger='vouchers'):
+        for _ in CODES:
+            client.post('/api/rewards/redeem', json={'reward_id': reward}, headers=headers)
+        client.post('/api/rewards/redeem', json={'reward_id': reward}, headers=headers)
+        assert alerts() == ['Voucher pool low', 'Voucher pool empty']
+
+        # Restocking above the threshold re-arms the alerts
+        client.post(f'/api/admin/rewards/{reward}/vouchers', headers=admin_headers,
+                    json={'codes': ['CODE-E', 'CODE-F', 'CODE-G']})
+        for _ in range(3):
+            client.post('/api/rewards/redeem', json={'reward_id': reward}, headers=headers)
+        assert alerts() == ['Voucher pool low', 'Voucher pool empty', 'Voucher pool low', 'Voucher pool empty']